@@ -1,41 +1,44 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, UploadFile, File, Query
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.hash import bcrypt
+from typing import Optional
+import codecs
+import csv
+import io
 
-from database import get_session, get_session_stock
+from database import get_session, get_session_stock, pool_stats, fabrica_lectura
 from models import Stock as StockDB, User as UserDB, StockRequest
-from schemas import StockCreate, UserCreate
-from auth import get_current_user
+from schemas import StockCreate, UserCreate, AprobacionLote, AprobacionResultado, AprobacionLoteResultado
+from busqueda import indexar_producto, desindexar_producto, invalidar_indice
+from dashboard import filtros_dashboard, cargar_dashboard, datos_solicitud
+from plantillas import templates, respuesta_stream
+from resumen import resumen_inventario
+from inventario import upsert_stock_lote, aprobar_solicitudes, cantidades_actuales
+from movimientos import movimiento, registrar_movimientos
+from catalogo import catalogo
+from eventos import publicar, publicar_cambio
+from config import CSV_IMPORT_BATCH_SIZE, CSV_IMPORT_MAX_ERRORS
+from auth import get_current_user, get_password_hash_async, invalidate_user_cache
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/")
 async def admin_dashboard(
     request: Request,
-    user=Depends(get_current_user),
-    session_stock: AsyncSession = Depends(get_session_stock),
-    session_user: AsyncSession = Depends(get_session)
+    filtros: dict = Depends(filtros_dashboard),
+    user=Depends(get_current_user)
 ):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    result_stock = await session_stock.execute(select(StockDB))
-    productos = result_stock.scalars().all()
-
-    result_solicitudes = await session_stock.execute(
-        select(StockRequest).order_by(StockRequest.fecha.desc())
-    )
-    solicitudes = result_solicitudes.scalars().all()
+    contexto = await cargar_dashboard(fabrica_lectura(request), request, filtros)
 
-    return templates.TemplateResponse("administration.html", {
+    return respuesta_stream("administration.html", {
         "request": request,
         "username": user.username,
-        "productos": productos,
-        "solicitudes": solicitudes
+        **contexto
     })
 
 @router.post("/productos/crear")
@@ -49,9 +52,17 @@ async def crear_producto(
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    nuevo = StockDB(name=name, quantity=quantity, branch=branch)
+    product_id, branch_id = await catalogo.ids(session, name, branch, crear=True)
+    nuevo = StockDB(product_id=product_id, branch_id=branch_id, name=name, quantity=quantity, branch=branch)
     session.add(nuevo)
-    await session.commit()
+    try:
+        await registrar_movimientos(session, [movimiento("alta", name, branch, quantity, user.username)])
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="El producto ya existe en esa sucursal")
+    indexar_producto(nuevo.id, nuevo.name, nuevo.branch)
+    publicar({"tipo": "creado", "branch": branch, "producto": name, "cantidad": quantity, "id": nuevo.id})
     return RedirectResponse(url="/admin", status_code=303)
 
 @router.post("/productos/eliminar")
@@ -67,9 +78,134 @@ async def eliminar_producto(
     producto = result.scalar_one_or_none()
     if producto:
         await session.delete(producto)
+        await registrar_movimientos(session, [
+            movimiento("baja", producto.name, producto.branch, -(producto.quantity or 0), user.username)
+        ])
         await session.commit()
+        desindexar_producto(producto.id)
+        publicar({"tipo": "eliminado", "branch": producto.branch, "producto": producto.name,
+                  "cantidad": producto.quantity or 0, "id": producto.id})
     return RedirectResponse(url="/admin", status_code=303)
 
+# Columnas del CSV de inventario (importación y exportación)
+COLUMNAS_CSV = ["name", "quantity", "branch"]
+
+#  Lee el archivo subido por bloques y entrega las líneas completas, sin cargarlo entero
+async def _lineas_csv(archivo: UploadFile, tamano_bloque: int = 64 * 1024):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    while True:
+        bloque = await archivo.read(tamano_bloque)
+        texto = resto + decoder.decode(bloque, final=not bloque)
+        lineas = texto.splitlines(keepends=True)
+        resto = lineas.pop() if lineas and bloque and not lineas[-1].endswith(("\n", "\r")) else ""
+        if lineas:
+            yield lineas
+        if not bloque:
+            break
+
+@router.post("/productos/importar")
+async def importar_productos(
+    archivo: UploadFile = File(...),
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    encabezado = None
+    sucursales = set()
+    lote: dict = {}
+    procesadas = 0
+    errores = []
+    numero_linea = 0
+
+    async def aplicar_lote():
+        nonlocal procesadas
+        # Cantidades previas (bloqueadas) para registrar la diferencia en el libro.
+        # Las filas nuevas quedan como alta aunque lleguen con cantidad 0: el libro
+        # es la versión de los ETags y de la sincronización de terminales
+        anteriores = await cantidades_actuales(session, [(f["name"], f["branch"]) for f in lote.values()])
+        await upsert_stock_lote(session, list(lote.values()))
+        await registrar_movimientos(session, [
+            movimiento("importacion", f["name"], f["branch"],
+                       f["quantity"] - anteriores[(f["name"], f["branch"])], user.username)
+            if (f["name"], f["branch"]) in anteriores else
+            movimiento("alta", f["name"], f["branch"], f["quantity"], user.username)
+            for f in lote.values()
+        ])
+        await session.commit()
+        procesadas += len(lote)
+        sucursales.update(branch for branch, _ in lote)
+        lote.clear()
+
+    async for lineas in _lineas_csv(archivo):
+        for fila in csv.reader(lineas):
+            numero_linea += 1
+            if not fila or not any(campo.strip() for campo in fila):
+                continue
+            if encabezado is None:
+                encabezado = [campo.strip().lower() for campo in fila]
+                faltantes = [c for c in COLUMNAS_CSV if c not in encabezado]
+                if faltantes:
+                    raise HTTPException(status_code=400, detail=f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+                continue
+
+            registro = dict(zip(encabezado, (campo.strip() for campo in fila)))
+            try:
+                cantidad = int(registro["quantity"])
+                if not registro["name"] or not registro["branch"] or cantidad < 0:
+                    raise ValueError
+            except (KeyError, ValueError):
+                if len(errores) < CSV_IMPORT_MAX_ERRORS:
+                    errores.append({"linea": numero_linea, "fila": fila})
+                continue
+
+            # Si un producto se repite en el mismo lote gana la última fila
+            lote[(registro["branch"], registro["name"])] = {
+                "name": registro["name"], "quantity": cantidad, "branch": registro["branch"]
+            }
+            if len(lote) >= CSV_IMPORT_BATCH_SIZE:
+                await aplicar_lote()
+
+    if lote:
+        await aplicar_lote()
+    invalidar_indice()
+    for branch in sucursales:
+        publicar({"tipo": "recargar", "branch": branch})
+
+    return {"procesadas": procesadas, "errores": errores}
+
+@router.get("/productos/exportar")
+async def exportar_productos(request: Request, user=Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+    fabrica = fabrica_lectura(request)
+
+    async def generar_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNAS_CSV)
+        yield buffer.getvalue()
+        # Sesión propia (réplica si hay): vive mientras dure la respuesta, con cursor del lado del servidor
+        async with fabrica() as session:
+            result = await session.stream(
+                select(StockDB.name, StockDB.quantity, StockDB.branch)
+                .order_by(StockDB.id)
+                .execution_options(yield_per=CSV_IMPORT_BATCH_SIZE)
+            )
+            async for filas in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(filas)
+                yield buffer.getvalue()
+
+    return StreamingResponse(
+        generar_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="inventario.csv"'},
+    )
+
 @router.get("/usuarios")
 async def listar_usuarios(
     request: Request,
@@ -104,12 +240,13 @@ async def crear_usuario(
     new_user = UserDB(
         username=username,
         email=email,
-        password_hash=bcrypt.hash(password),
+        password_hash=await get_password_hash_async(password),
         role=role,
         branch=branch
     )
     session.add(new_user)
     await session.commit()
+    invalidate_user_cache(username)
     return RedirectResponse(url="/admin/usuarios", status_code=303)
 
 @router.post("/usuarios/eliminar")
@@ -126,8 +263,22 @@ async def eliminar_usuario(
     if usuario:
         await session.delete(usuario)
         await session.commit()
+        invalidate_user_cache(usuario.username)
     return RedirectResponse(url="/admin/usuarios", status_code=303)
 
+#  Publica los cambios de stock de las solicitudes aprobadas (después del commit)
+def _publicar_aprobaciones(solicitudes, resultados, creados):
+    nuevos = {(stock.name, stock.branch) for stock in creados}
+    for solicitud, (ok, _) in zip(solicitudes, resultados):
+        if not ok:
+            continue
+        publicar_cambio("transferencia", solicitud.sucursal_origen, solicitud.producto, -solicitud.cantidad,
+                        solicitud=datos_solicitud(solicitud))
+        if (solicitud.producto, solicitud.sucursal_destino) not in nuevos:
+            publicar_cambio("transferencia", solicitud.sucursal_destino, solicitud.producto, solicitud.cantidad)
+    for stock in creados:
+        publicar({"tipo": "creado", "branch": stock.branch, "producto": stock.name, "cantidad": stock.quantity, "id": stock.id})
+
 @router.post("/solicitudes/aprobar")
 async def aprobar_solicitud(
     id: int = Form(...),
@@ -137,40 +288,105 @@ async def aprobar_solicitud(
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    solicitud_result = await session.execute(select(StockRequest).where(StockRequest.id == id))
+    solicitud_result = await session.execute(
+        select(StockRequest).where(StockRequest.id == id).with_for_update()
+    )
     solicitud = solicitud_result.scalar_one_or_none()
-    
+
     if not solicitud or solicitud.estado != "pendiente":
         raise HTTPException(status_code=400, detail="Solicitud no válida o ya procesada")
 
-    origen_result = await session.execute(select(StockDB).where(
-        StockDB.name == solicitud.producto,
-        StockDB.branch == solicitud.sucursal_origen
-    ))
-    stock_origen = origen_result.scalar_one_or_none()
+    resultados, creados = await aprobar_solicitudes(session, [solicitud], user.username)
+    ok, detalle = resultados[0]
+    if not ok:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail=detalle)
 
-    if not stock_origen or stock_origen.quantity < solicitud.cantidad:
-        raise HTTPException(status_code=400, detail="Stock insuficiente en sucursal origen")
+    await session.commit()
+    _publicar_aprobaciones([solicitud], resultados, creados)
 
-    stock_origen.quantity -= solicitud.cantidad
+    return RedirectResponse(url="/admin", status_code=303)
 
-    destino_result = await session.execute(select(StockDB).where(
-        StockDB.name == solicitud.producto,
-        StockDB.branch == solicitud.sucursal_destino
-    ))
-    stock_destino = destino_result.scalar_one_or_none()
+@router.post("/solicitudes/aprobar-lote", response_model=AprobacionLoteResultado)
+async def aprobar_solicitudes_lote(
+    lote: AprobacionLote,
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+    if not lote.ids and not (lote.sucursal_origen or lote.sucursal_destino):
+        raise HTTPException(status_code=400, detail="Indica ids o una sucursal de origen/destino")
 
-    if stock_destino:
-        stock_destino.quantity += solicitud.cantidad
+    stmt = select(StockRequest).order_by(StockRequest.fecha, StockRequest.id).with_for_update()
+    if lote.ids:
+        stmt = stmt.where(StockRequest.id.in_(lote.ids))
     else:
-        nuevo = StockDB(
-            name=solicitud.producto,
-            quantity=solicitud.cantidad,
-            branch=solicitud.sucursal_destino
-        )
-        session.add(nuevo)
-
-    solicitud.estado = "aprobado"
+        stmt = stmt.where(StockRequest.estado == "pendiente").limit(lote.limite)
+    if lote.sucursal_origen:
+        stmt = stmt.where(StockRequest.sucursal_origen == lote.sucursal_origen)
+    if lote.sucursal_destino:
+        stmt = stmt.where(StockRequest.sucursal_destino == lote.sucursal_destino)
+    solicitudes = (await session.execute(stmt)).scalars().all()
+
+    resultados, creados = await aprobar_solicitudes(session, solicitudes, user.username)
     await session.commit()
+    _publicar_aprobaciones(solicitudes, resultados, creados)
 
-    return RedirectResponse(url="/admin", status_code=303)
+    reporte = [
+        AprobacionResultado(id=solicitud.id, ok=ok, detalle=detalle)
+        for solicitud, (ok, detalle) in zip(solicitudes, resultados)
+    ]
+    if lote.ids:
+        encontrados = {solicitud.id for solicitud in solicitudes}
+        reporte += [
+            AprobacionResultado(id=id, ok=False, detalle="Solicitud no encontrada")
+            for id in dict.fromkeys(lote.ids) if id not in encontrados
+        ]
+    aprobadas = sum(1 for r in reporte if r.ok)
+    return AprobacionLoteResultado(aprobadas=aprobadas, rechazadas=len(reporte) - aprobadas, resultados=reporte)
+
+@router.get("/resumen")
+async def resumen_stock(
+    branch: Optional[str] = Query(default=None, description="Filtra las alertas de bajo stock"),
+    limite: int = Query(default=100, ge=1, le=1000),
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    await resumen_inventario.asegurar(session)
+    return {
+        "totales": resumen_inventario.totales(),
+        "por_sucursal": resumen_inventario.por_sucursal,
+        "bajo_stock": resumen_inventario.alertas(branch, limite),
+    }
+
+@router.get("/resumen/productos/{nombre}")
+async def resumen_producto(
+    nombre: str,
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    await resumen_inventario.asegurar(session)
+    total = resumen_inventario.por_producto.get(nombre)
+    if total is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return {"producto": nombre, **total}
+
+@router.get("/pool")
+async def estado_pool(user=Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+    return pool_stats()
+
+@router.get("/admision")
+async def estado_control_admision(user=Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+    from admision import estado_admision
+    return estado_admision()
@@ -0,0 +1,154 @@
+from collections import deque
+from typing import Optional
+import asyncio
+
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+
+from auth import claims_de_cookie
+from config import (
+    ADMISSION_LOGIN_LIMIT, ADMISSION_WRITE_LIMIT, ADMISSION_READ_LIMIT, ADMISSION_ADMIN_LIMIT,
+    ADMISSION_BRANCH_LIMIT, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+# =============================================
+# 🔸 Control de admisión y desborde de carga
+# =============================================
+#
+# Cada petición ocupa un cupo de su clase de ruta (login, escrituras, lecturas,
+# admin) y, si el token trae sucursal, uno de su sucursal. Sin cupo libre espera
+# en una cola corta; si la cola está llena o la espera pasa del límite se
+# responde de inmediato: 429 si el límite es el de la sucursal, 503 si es el
+# de la clase. Así una tormenta de logins o una exportación del admin no dejan
+# sin servicio a las cajas. Los límites son por worker.
+
+# Rutas de larga duración que no ocupan cupo (stream SSE) o de monitoreo
+RUTAS_EXENTAS = {"/stock/eventos", "/metrics"}
+_METODOS_LECTURA = {"GET", "HEAD", "OPTIONS"}
+
+class Limite:
+    def __init__(self, capacidad: int, cola: int):
+        self.capacidad = capacidad
+        self.cola = cola
+        self.activos = 0
+        self.esperando: deque = deque()
+        self.rechazadas = 0
+
+    #  Ocupa un cupo; devuelve False si no hay lugar en la cola o se agotó la espera
+    async def entrar(self, espera: float) -> bool:
+        if self.activos < self.capacidad and not self.esperando:
+            self.activos += 1
+            return True
+        if len(self.esperando) >= self.cola:
+            self.rechazadas += 1
+            return False
+
+        turno = asyncio.get_running_loop().create_future()
+        self.esperando.append(turno)
+        try:
+            await asyncio.wait_for(asyncio.shield(turno), espera)
+            return True
+        except asyncio.TimeoutError:
+            if self._abandonar(turno):
+                return True
+            self.rechazadas += 1
+            return False
+        except asyncio.CancelledError:
+            if self._abandonar(turno):
+                self.salir()
+            raise
+
+    def _abandonar(self, turno) -> bool:
+        # True si el cupo llegó justo al rendirse (ya es de esta petición)
+        if turno.done():
+            return True
+        turno.cancel()
+        self.esperando.remove(turno)
+        return False
+
+    def salir(self) -> None:
+        while self.esperando:
+            turno = self.esperando.popleft()
+            if not turno.done():
+                turno.set_result(None)  # El cupo pasa directo al siguiente en la cola
+                return
+        self.activos -= 1
+
+    def estado(self) -> dict:
+        return {
+            "capacidad": self.capacidad,
+            "activos": self.activos,
+            "en_cola": len(self.esperando),
+            "rechazadas": self.rechazadas,
+        }
+
+limites_clase = {
+    "login": Limite(ADMISSION_LOGIN_LIMIT, ADMISSION_QUEUE_SIZE),
+    "escrituras": Limite(ADMISSION_WRITE_LIMIT, ADMISSION_QUEUE_SIZE),
+    "lecturas": Limite(ADMISSION_READ_LIMIT, ADMISSION_QUEUE_SIZE),
+    "admin": Limite(ADMISSION_ADMIN_LIMIT, ADMISSION_QUEUE_SIZE),
+}
+limites_sucursal: dict[str, Limite] = {}
+
+def clase_de_ruta(metodo: str, ruta: str) -> Optional[str]:
+    if ruta in RUTAS_EXENTAS:
+        return None
+    if ruta == "/token" and metodo == "POST":
+        return "login"
+    if ruta == "/admin" or ruta.startswith("/admin/"):
+        return "admin"
+    return "lecturas" if metodo in _METODOS_LECTURA else "escrituras"
+
+def _limite_sucursal(branch: str) -> Limite:
+    limite = limites_sucursal.get(branch)
+    if limite is None:
+        limite = limites_sucursal[branch] = Limite(ADMISSION_BRANCH_LIMIT, ADMISSION_QUEUE_SIZE)
+    return limite
+
+#  Cupos y rechazos actuales (para /admin/admision)
+def estado_admision() -> dict:
+    return {
+        "clases": {nombre: limite.estado() for nombre, limite in limites_clase.items()},
+        "sucursales": {branch: limite.estado() for branch, limite in sorted(limites_sucursal.items())},
+    }
+
+class AdmisionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        clase = clase_de_ruta(scope["method"], scope["path"])
+        if clase is None:
+            return await self.app(scope, receive, send)
+
+        # La sucursal sale del token firmado; el admin no tiene límite por sucursal
+        sucursal = None
+        if clase != "login":
+            claims = claims_de_cookie(HTTPConnection(scope).cookies.get("Authorization"))
+            if claims and claims.get("branch") and claims.get("role") != "admin":
+                sucursal = _limite_sucursal(claims["branch"])
+
+        if sucursal is not None and not await sucursal.entrar(ADMISSION_QUEUE_TIMEOUT_SECONDS):
+            return await self._rechazar(scope, receive, send, 429, "Demasiadas peticiones de tu sucursal, intenta de nuevo")
+        try:
+            limite = limites_clase[clase]
+            if not await limite.entrar(ADMISSION_QUEUE_TIMEOUT_SECONDS):
+                return await self._rechazar(scope, receive, send, 503, "Servidor ocupado, intenta de nuevo en unos segundos")
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                limite.salir()
+        finally:
+            if sucursal is not None:
+                sucursal.salir()
+
+    async def _rechazar(self, scope, receive, send, status_code: int, detalle: str):
+        respuesta = JSONResponse(
+            {"detail": detalle},
+            status_code=status_code,
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+        await respuesta(scope, receive, send)
@@ -0,0 +1,91 @@
+from typing import List, Optional, Tuple
+import asyncio
+
+from database import SessionLocalStock
+from eventos import publicar_cambio
+from inventario import descontar_lote, ConflictoDeStock
+from movimientos import movimiento, registrar_movimientos
+from config import SALES_COALESCE_WINDOW_MS, SALES_COALESCE_MAX_BATCH
+
+# =============================================
+# 🔸 Agrupación de ventas por sucursal (group commit)
+# =============================================
+#
+# En vez de un UPDATE y un COMMIT por venta, las ventas de una misma sucursal
+# que llegan dentro de una ventana corta se aplican juntas con descontar_lote:
+# un SELECT ... FOR UPDATE, un UPDATE ... CASE por producto y un solo COMMIT.
+# Las líneas se validan en orden de llegada, así que cada cajero recibe su
+# propio resultado (incluido "stock insuficiente") como si hubiera ido solo.
+# Mientras un lote hace COMMIT, las ventas nuevas se juntan en el siguiente.
+
+# Reintentos de un lote si otra transacción cambió las filas (SQLite no bloquea)
+REINTENTOS_CONFLICTO = 3
+
+class AgrupadorVentas:
+    def __init__(self, fabrica, ventana_ms: float, max_lote: int):
+        self.fabrica = fabrica
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max_lote
+        # branch -> [(producto, cantidad, usuario, futuro)]
+        self._pendientes: dict[str, list] = {}
+        self._programadas: set = set()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._tareas: set = set()  # Referencias fuertes a los vaciados en curso
+        self.lotes = 0
+        self.ventas = 0
+
+    #  Encola una venta y espera su resultado: (ok, detalle) como en descontar_lote
+    async def registrar(self, producto: str, branch: str, cantidad: int, usuario: Optional[str]) -> Tuple[bool, Optional[str]]:
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes.setdefault(branch, []).append((producto, cantidad, usuario, futuro))
+        if branch not in self._programadas:
+            self._programadas.add(branch)
+            tarea = asyncio.create_task(self._vaciar(branch))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+        return await futuro
+
+    async def _vaciar(self, branch: str) -> None:
+        await asyncio.sleep(self.ventana)
+        lock = self._locks.setdefault(branch, asyncio.Lock())
+        async with lock:
+            # Lo que llegue desde aquí va al siguiente lote (que espera este lock)
+            self._programadas.discard(branch)
+            lote = self._pendientes.pop(branch, [])
+            for inicio in range(0, len(lote), self.max_lote):
+                await self._aplicar(branch, lote[inicio:inicio + self.max_lote])
+
+    async def _aplicar(self, branch: str, lote: List[tuple]) -> None:
+        items = [(producto, cantidad) for producto, cantidad, _, _ in lote]
+        try:
+            for intento in range(REINTENTOS_CONFLICTO):
+                try:
+                    async with self.fabrica() as session:
+                        resultados = await descontar_lote(session, branch, items)
+                        await registrar_movimientos(session, [
+                            movimiento("venta", producto, branch, -cantidad, usuario)
+                            for (producto, cantidad, usuario, _), (ok, _) in zip(lote, resultados) if ok
+                        ])
+                        await session.commit()
+                    break
+                except ConflictoDeStock:
+                    if intento == REINTENTOS_CONFLICTO - 1:
+                        raise
+        except Exception as e:
+            for *_, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        self.lotes += 1
+        self.ventas += len(lote)
+        vendidos: dict[str, int] = {}
+        for (producto, cantidad, _, futuro), resultado in zip(lote, resultados):
+            if resultado[0]:
+                vendidos[producto] = vendidos.get(producto, 0) + cantidad
+            if not futuro.done():
+                futuro.set_result(resultado)
+        for producto, cantidad in vendidos.items():
+            publicar_cambio("venta", branch, producto, -cantidad)
+
+agrupador_ventas = AgrupadorVentas(SessionLocalStock, SALES_COALESCE_WINDOW_MS, SALES_COALESCE_MAX_BATCH)
@@ -1,30 +1,156 @@
 from fastapi import HTTPException, Depends, status, Request
-from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.hash import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
+import asyncio
+import time
 
 from models import User
 from database import get_session
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS, HASH_WORKERS, HASH_QUEUE_LIMIT,
+    USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE, TRUST_TOKEN_CLAIMS,
+)
+
+# passlib y jose se importan en el primer uso (login o primera petición
+# autenticada) y no durante el arranque del contenedor
+
+#  bcrypt con el costo configurado; los hashes con otro costo se re-hashean al iniciar sesión
+@lru_cache(maxsize=None)
+def _bcrypt():
+    from passlib.hash import bcrypt
+    return bcrypt.using(rounds=BCRYPT_ROUNDS)
+
+def _jose():
+    from jose import jwt, JWTError
+    return jwt, JWTError
+
+# Pool dedicado para bcrypt: la librería libera el GIL, así que los hilos
+# hashean en paralelo sin bloquear el event loop de uvicorn
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pendientes = 0
+
+# Caché LRU con expiración de usuarios autenticados: username -> (expira, User)
+_user_cache: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+# Usuarios modificados/eliminados: username -> momento de invalidación.
+# Los tokens emitidos antes de ese momento no pueden confiar en sus claims.
+_user_invalidado: dict[str, float] = {}
 
 #  Verifica si el password ingresado coincide con el hash
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.verify(plain_password, hashed_password)
+    return _bcrypt().verify(plain_password, hashed_password)
 
 #  Hashea un password antes de almacenarlo
 def get_password_hash(password: str) -> str:
-    return bcrypt.hash(password)
+    return _bcrypt().hash(password)
+
+#  Indica si el hash fue generado con un costo distinto al configurado
+def password_needs_rehash(hashed_password: str) -> bool:
+    return _bcrypt().needs_update(hashed_password)
+
+#  Ejecuta una operación bcrypt en el pool, rechazando con 503 si la cola está llena
+async def _run_hash(func, *args):
+    global _hash_pendientes
+    if _hash_pendientes >= HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, intenta de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pendientes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pendientes -= 1
+
+#  Versión asíncrona de verify_password (no bloquea el event loop)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+#  Versión asíncrona de get_password_hash (no bloquea el event loop)
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash(get_password_hash, password)
+
+#  Verifica credenciales y re-hashea la contraseña si cambió el costo configurado
+async def authenticate_user(session: AsyncSession, username: str, password: str) -> Optional[User]:
+    user = await get_user(session, username)
+    if not user or not await verify_password_async(password, user.password_hash):
+        return None
+
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await get_password_hash_async(password)
+        await session.commit()
+
+    return user
 
 #  Crea un JWT válido con expiración
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now})
+    jwt, _ = _jose()
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+#  Claims de rol y sucursal que se firman en el token del usuario
+def user_claims(user: User) -> dict:
+    return {"sub": user.username, "uid": user.id, "role": user.role, "branch": user.branch}
+
+#  Elimina un usuario de la caché (llamar al crear, modificar o eliminar usuarios)
+def invalidate_user_cache(username: str) -> None:
+    _user_cache.pop(username, None)
+    now = time.time()
+    _user_invalidado[username] = now
+    # Pasada la vida de un token ya no hace falta recordar la invalidación
+    limite = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    for nombre in [n for n, t in _user_invalidado.items() if t < limite]:
+        del _user_invalidado[nombre]
+
+def _user_cache_get(username: str) -> Optional[User]:
+    entry = _user_cache.get(username)
+    if entry is None:
+        return None
+    expira, user = entry
+    if expira < time.monotonic():
+        del _user_cache[username]
+        return None
+    _user_cache.move_to_end(username)
+    return user
+
+def _user_cache_set(user: User) -> None:
+    if USER_CACHE_TTL_SECONDS <= 0 or USER_CACHE_MAX_SIZE <= 0:
+        return
+    _user_cache[user.username] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user)
+    _user_cache.move_to_end(user.username)
+    while len(_user_cache) > USER_CACHE_MAX_SIZE:
+        _user_cache.popitem(last=False)
+
+#  Construye el usuario desde los claims firmados si se permite confiar en ellos
+def _user_from_claims(payload: dict) -> Optional[User]:
+    if not TRUST_TOKEN_CLAIMS or "role" not in payload or "uid" not in payload:
+        return None
+    invalidado = _user_invalidado.get(payload["sub"])
+    if invalidado is not None and payload.get("iat", 0) <= invalidado:
+        return None
+    return User(id=payload["uid"], username=payload["sub"], role=payload["role"], branch=payload.get("branch"))
+
+#  Claims verificados del valor de la cookie Authorization (None si falta o no es válido).
+#  No consulta la base; lo usa el control de admisión para conocer la sucursal.
+def claims_de_cookie(valor: Optional[str]) -> Optional[dict]:
+    if not valor or not valor.startswith("Bearer "):
+        return None
+    jwt, JWTError = _jose()
+    try:
+        return jwt.decode(valor[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
 #  Obtiene el usuario actual desde la cookie segura Authorization
 async def get_current_user(
     request: Request,
@@ -39,6 +165,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    jwt, JWTError = _jose()
     try:
         token = token[7:]  # Quitar "Bearer "
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -47,12 +174,17 @@ async def get_current_user(
         if not username:
             raise HTTPException(status_code=401, detail="Token sin usuario")
 
+        user = _user_from_claims(payload) or _user_cache_get(username)
+        if user is not None:
+            return user
+
         result = await session.execute(select(User).where(User.username == username))
         user = result.scalar_one_or_none()
 
         if not user:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
 
+        _user_cache_set(user)
         return user
 
     except JWTError:
@@ -67,11 +199,12 @@ async def create_user(
     role: str = "user",
     branch: Optional[str] = None
 ) -> User:
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     db_user = User(username=username, email=email, password_hash=hashed_password, role=role, branch=branch)
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    invalidate_user_cache(username)
     return db_user
 
 #  Busca un usuario por username
@@ -0,0 +1,142 @@
+"""Benchmark de ventas sobre pocos productos calientes: una transacción por venta vs. group commit.
+
+Compara ``inventario.descontar_stock`` con un COMMIT por venta (flujo normal de
+``/registrar-venta``) contra ``agrupador.AgrupadorVentas``, que junta las
+ventas de la sucursal durante unos milisegundos y las aplica con un solo
+COMMIT. Ambos escriben el libro de movimientos. Reporta ventas por segundo,
+latencia p50/p95/p99 y el tamaño promedio de lote.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.bench_agrupado --ventas 5000 --concurrencia 64
+    python -m benchmarks.bench_agrupado --ventana-ms 2 --productos 1
+    BENCH_DATABASE_URL=mysql+aiomysql://... python -m benchmarks.bench_agrupado
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_agrupado_")
+BENCH_URL = os.environ.get("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/stock.db")
+os.environ.setdefault("DATABASE_URL_SQL", f"sqlite+aiosqlite:///{_tmp}/users.db")
+os.environ.setdefault("DATABASE_URL_SQL_STOCK", BENCH_URL)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from database import BaseSQLStock
+from models import Stock as StockDB
+from inventario import descontar_stock
+from catalogo import catalogo
+from movimientos import movimiento, registrar_movimientos
+from agrupador import AgrupadorVentas
+from benchmarks.reporte import resumen_latencias
+
+SUCURSAL = "soacha"
+
+
+def producto(i):
+    return f"caliente-{i}"
+
+
+async def correr(Session, nombre, vender, ventas, concurrencia, productos, inicial):
+    async with Session() as session:
+        await session.execute(delete(StockDB).where(StockDB.name.like("caliente-%")))
+        await session.commit()
+        ids, sucursales = await catalogo.resolver(
+            session, [producto(i) for i in range(productos)], [SUCURSAL], crear=True
+        )
+        for caliente, product_id in ids.items():
+            session.add(StockDB(product_id=product_id, branch_id=sucursales[SUCURSAL],
+                                name=caliente, quantity=inicial, branch=SUCURSAL))
+        await session.commit()
+
+    pendientes = iter(range(ventas))
+    latencias = []
+    aceptadas = 0
+    errores = 0
+
+    async def trabajador():
+        nonlocal aceptadas, errores
+        for i in pendientes:
+            inicio = time.perf_counter()
+            try:
+                if await vender(producto(i % productos), 1):
+                    aceptadas += 1
+            except Exception:
+                errores += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    async with Session() as session:
+        result = await session.execute(select(StockDB.quantity).where(StockDB.name.like("caliente-%")))
+        descontadas = productos * inicial - sum(result.scalars().all())
+
+    resultado = {
+        "estrategia": nombre,
+        "ventas": ventas,
+        "concurrencia": concurrencia,
+        "productos": productos,
+        "aceptadas": aceptadas,
+        "errores": errores,
+        # Debe ser 0: cada venta aceptada se descontó exactamente una vez
+        "unidades_perdidas": aceptadas - descontadas,
+    }
+    resultado.update(resumen_latencias(latencias, duracion))
+    return resultado
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ventas", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    parser.add_argument("--productos", type=int, default=3, help="Productos calientes de la sucursal")
+    parser.add_argument("--inicial", type=int, default=1_000_000)
+    parser.add_argument("--ventana-ms", type=float, default=5)
+    parser.add_argument("--max-lote", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_async_engine(BENCH_URL, pool_size=args.concurrencia, max_overflow=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseSQLStock.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    #  Una transacción y un COMMIT por venta
+    async def venta_individual(nombre, cantidad):
+        async with Session() as session:
+            ok = await descontar_stock(session, nombre, SUCURSAL, cantidad)
+            if ok:
+                await registrar_movimientos(session, [movimiento("venta", nombre, SUCURSAL, -cantidad)])
+            await session.commit()
+            return ok
+
+    agrupador = AgrupadorVentas(Session, args.ventana_ms, args.max_lote)
+
+    #  La venta espera su lugar en el siguiente lote de la sucursal
+    async def venta_agrupada(nombre, cantidad):
+        ok, _ = await agrupador.registrar(nombre, SUCURSAL, cantidad, None)
+        return ok
+
+    reporte = [
+        await correr(Session, "individual", venta_individual, args.ventas, args.concurrencia, args.productos, args.inicial),
+        await correr(Session, "agrupada", venta_agrupada, args.ventas, args.concurrencia, args.productos, args.inicial),
+    ]
+    reporte[1]["ventana_ms"] = args.ventana_ms
+    reporte[1]["lotes"] = agrupador.lotes
+    reporte[1]["ventas_por_lote"] = round(agrupador.ventas / agrupador.lotes, 1) if agrupador.lotes else 0
+    await engine.dispose()
+    print(json.dumps(reporte, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
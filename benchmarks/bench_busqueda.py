@@ -0,0 +1,124 @@
+"""Benchmark de búsqueda de productos por modo y tamaño de catálogo.
+
+Siembra N productos repartidos en cinco sucursales y mide la latencia de
+``busqueda.filtro_busqueda`` en cada modo (contiene = ILIKE anterior,
+prefijo, trigramas y, solo en MySQL, fulltext).
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.bench_busqueda --tamanos 10000,100000,1000000
+    BENCH_DATABASE_URL=mysql+aiomysql://... python -m benchmarks.bench_busqueda
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_busqueda_")
+BENCH_URL = os.environ.get("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/stock.db")
+os.environ.setdefault("DATABASE_URL_SQL", f"sqlite+aiosqlite:///{_tmp}/users.db")
+os.environ.setdefault("DATABASE_URL_SQL_STOCK", BENCH_URL)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from database import BaseSQLStock
+from models import Stock as StockDB
+import busqueda
+from benchmarks.reporte import percentil
+
+SUCURSALES = ["soacha", "suba", "centro", "cedritos", "sanmateo"]
+PALABRAS = [
+    "arroz", "frijol", "lenteja", "azucar", "cafe", "panela", "aceite", "harina",
+    "leche", "queso", "galleta", "jabon", "detergente", "papel", "atun", "sal",
+]
+
+
+def nombre_producto(i: int) -> str:
+    rng = random.Random(i)
+    return f"{rng.choice(PALABRAS)} {rng.choice(PALABRAS)} {i:07d}"
+
+
+async def sembrar(Session, total: int, lote: int = 10_000):
+    async with Session() as session:
+        await session.execute(delete(StockDB))
+        for inicio in range(0, total, lote):
+            filas = [
+                {"name": nombre_producto(i), "quantity": i % 50, "branch": SUCURSALES[i % len(SUCURSALES)]}
+                for i in range(inicio, min(total, inicio + lote))
+            ]
+            await session.execute(insert(StockDB), filas)
+        await session.commit()
+
+
+async def medir(Session, modo: str, consultas: list) -> dict:
+    latencias = []
+    encontrados = 0
+    async with Session() as session:
+        for texto, sucursal in consultas:
+            inicio = time.perf_counter()
+            condicion = await busqueda.filtro_busqueda(session, texto, modo, sucursal)
+            stmt = select(StockDB).where(condicion, StockDB.branch == sucursal)
+            encontrados += len((await session.execute(stmt)).scalars().all())
+            latencias.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "modo": modo,
+        "consultas": len(consultas),
+        "resultados": encontrados,
+        "p50_ms": round(statistics.median(latencias), 3),
+        "p95_ms": round(percentil(latencias, 0.95), 3),
+        "max_ms": round(max(latencias), 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", default="10000,100000,1000000")
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_async_engine(BENCH_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseSQLStock.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    modos = ["contiene", "prefijo", "trigramas"]
+    if engine.dialect.name == "mysql":
+        modos.append("fulltext")
+
+    rng = random.Random(7)
+    consultas = [(rng.choice(PALABRAS)[:rng.randint(3, 5)], rng.choice(SUCURSALES)) for _ in range(args.consultas)]
+
+    reporte = []
+    for tamano in (int(t) for t in args.tamanos.split(",")):
+        inicio = time.perf_counter()
+        await sembrar(Session, tamano)
+        siembra = time.perf_counter() - inicio
+
+        # El índice de trigramas se construye una vez y se mide aparte
+        busqueda.indice_trigramas.construido = 0.0
+        inicio = time.perf_counter()
+        async with Session() as session:
+            await busqueda.indice_trigramas.asegurar(session)
+        construccion = time.perf_counter() - inicio
+
+        for modo in modos:
+            resultado = await medir(Session, modo, consultas)
+            resultado.update({"productos": tamano, "siembra_s": round(siembra, 2)})
+            if modo == "trigramas":
+                resultado["construccion_indice_s"] = round(construccion, 2)
+            reporte.append(resultado)
+
+    await engine.dispose()
+    print(json.dumps(reporte, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Benchmark de ventas concurrentes sobre un producto "caliente".
+
+Compara el flujo anterior (SELECT + validar en Python + UPDATE por ORM) contra
+el UPDATE condicional de ``inventario.descontar_stock``. Reporta ventas por
+segundo y unidades perdidas por actualizaciones concurrentes.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.bench_ventas --ventas 2000 --concurrencia 32
+    BENCH_DATABASE_URL=mysql+aiomysql://... python -m benchmarks.bench_ventas
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_ventas_")
+BENCH_URL = os.environ.get("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/stock.db")
+os.environ.setdefault("DATABASE_URL_SQL", f"sqlite+aiosqlite:///{_tmp}/users.db")
+os.environ.setdefault("DATABASE_URL_SQL_STOCK", BENCH_URL)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from database import BaseSQLStock
+from models import Stock as StockDB
+from inventario import descontar_stock
+from catalogo import catalogo
+
+PRODUCTO = "producto-caliente"
+SUCURSAL = "soacha"
+
+
+#  Flujo anterior: leer, validar en Python y escribir (tres viajes y carrera)
+async def venta_leer_modificar(session, cantidad):
+    result = await session.execute(
+        select(StockDB).where(StockDB.name == PRODUCTO, StockDB.branch == SUCURSAL)
+    )
+    item = result.scalar_one_or_none()
+    if item is None or item.quantity < cantidad:
+        return False
+    await asyncio.sleep(0)  # Cede el loop como lo haría un viaje real a la base
+    item.quantity -= cantidad
+    await session.commit()
+    return True
+
+
+#  Flujo nuevo: un solo UPDATE condicional
+async def venta_atomica(session, cantidad):
+    ok = await descontar_stock(session, PRODUCTO, SUCURSAL, cantidad)
+    await session.commit()
+    return ok
+
+
+async def correr(engine, estrategia, ventas, concurrencia, inicial):
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as session:
+        await session.execute(delete(StockDB).where(StockDB.name == PRODUCTO))
+        await session.commit()
+        product_id, branch_id = await catalogo.ids(session, PRODUCTO, SUCURSAL, crear=True)
+        session.add(StockDB(product_id=product_id, branch_id=branch_id, name=PRODUCTO, quantity=inicial, branch=SUCURSAL))
+        await session.commit()
+
+    pendientes = iter(range(ventas))
+    aceptadas = 0
+    errores = 0
+
+    async def trabajador():
+        nonlocal aceptadas, errores
+        for _ in pendientes:
+            async with Session() as session:
+                try:
+                    if await estrategia(session, 1):
+                        aceptadas += 1
+                except Exception:
+                    errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    async with Session() as session:
+        result = await session.execute(
+            select(StockDB.quantity).where(StockDB.name == PRODUCTO, StockDB.branch == SUCURSAL)
+        )
+        final = result.scalar_one()
+
+    return {
+        "estrategia": estrategia.__name__,
+        "ventas": ventas,
+        "concurrencia": concurrencia,
+        "aceptadas": aceptadas,
+        "errores": errores,
+        "segundos": round(duracion, 4),
+        "ventas_por_segundo": round(ventas / duracion, 1),
+        # Unidades vendidas que no se descontaron (actualizaciones perdidas)
+        "unidades_perdidas": aceptadas - (inicial - final),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ventas", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--inicial", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    engine = create_async_engine(BENCH_URL, pool_size=args.concurrencia, max_overflow=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseSQLStock.metadata.create_all)
+
+    reporte = []
+    for estrategia in (venta_leer_modificar, venta_atomica):
+        reporte.append(await correr(engine, estrategia, args.ventas, args.concurrencia, args.inicial))
+    await engine.dispose()
+    print(json.dumps(reporte, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
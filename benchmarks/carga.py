@@ -0,0 +1,248 @@
+"""Suite de carga reproducible contra la app completa y bases locales.
+
+Arranca ``main.app`` en proceso (httpx + ASGITransport) apuntando
+DATABASE_URL_SQL y DATABASE_URL_SQL_STOCK a SQLite (aiosqlite) en un
+directorio temporal, siembra usuarios, sucursales, productos e historial de
+solicitudes a la escala indicada y ejecuta escenarios concurrentes. Imprime
+un reporte JSON con throughput y latencias p50/p95/p99 por escenario.
+
+Uso (desde la raíz del repo, con benchmarks/requirements.txt instalado):
+
+    python -m benchmarks.carga
+    python -m benchmarks.carga --productos 50000 --solicitudes 20000 --concurrencia 64
+    python -m benchmarks.carga --escenarios ventas_concurrentes,listado_json --salida reporte.json
+
+Para medir contra otras bases, definir BENCH_DATABASE_URL_SQL y
+BENCH_DATABASE_URL_SQL_STOCK (las tablas se crean si no existen).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ESCENARIOS = ("login_storm", "ventas_concurrentes", "dashboard_admin", "listado_json")
+SUCURSALES = ["soacha", "suba", "centro", "cedritos", "sanmateo"]
+PASSWORD = "benchmark123"
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=50, help="Cajeros por sucursal")
+    parser.add_argument("--productos", type=int, default=5000, help="Productos por sucursal")
+    parser.add_argument("--solicitudes", type=int, default=5000, help="Historial de solicitudes")
+    parser.add_argument("--productos-calientes", type=int, default=5)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--peticiones", type=int, default=500, help="Peticiones por escenario")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--salida", help="Archivo donde guardar el reporte JSON")
+    return parser.parse_args()
+
+
+def configurar_entorno(args):
+    # Debe ocurrir antes de importar la app: database.py y config.py leen el entorno al importarse
+    tmp = tempfile.mkdtemp(prefix="bench_carga_")
+    os.environ["DATABASE_URL_SQL"] = os.environ.get("BENCH_DATABASE_URL_SQL", f"sqlite+aiosqlite:///{tmp}/users.db")
+    os.environ["DATABASE_URL_SQL_STOCK"] = os.environ.get("BENCH_DATABASE_URL_SQL_STOCK", f"sqlite+aiosqlite:///{tmp}/stock.db")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # La cola de hashing por defecto rechazaría la tormenta de logins con 503
+    os.environ.setdefault("HASH_QUEUE_LIMIT", str(max(args.concurrencia * 2, 64)))
+
+
+async def sembrar(args, rng):
+    from sqlalchemy import insert
+    from datetime import datetime, timedelta, timezone
+
+    import auth
+    import database
+    from models import User, Stock, StockRequest, Product, Branch
+
+    await database.init_db()
+    password_hash = auth.get_password_hash(PASSWORD)  # Un solo hash para todos los usuarios
+
+    async with database.SessionLocal() as session:
+        usuarios = [
+            {"username": f"cajero_{branch}_{i}", "email": f"cajero{i}@{branch}.test",
+             "password_hash": password_hash, "role": "user", "branch": branch}
+            for branch in SUCURSALES for i in range(args.usuarios)
+        ]
+        usuarios.append({"username": "admin_bench", "email": "admin@bench.test",
+                         "password_hash": password_hash, "role": "admin", "branch": SUCURSALES[0]})
+        await session.execute(insert(User), usuarios)
+        await session.commit()
+
+    async with database.SessionLocalStock() as session:
+        # Base recién creada: los ids del catálogo se asignan aquí mismo
+        await session.execute(insert(Branch), [
+            {"id": j + 1, "code": branch} for j, branch in enumerate(SUCURSALES)
+        ])
+        for inicio in range(0, args.productos, 5000):
+            await session.execute(insert(Product), [
+                {"id": i + 1, "name": f"producto-{i:07d}"}
+                for i in range(inicio, min(inicio + 5000, args.productos))
+            ])
+
+        lote = []
+        for j, branch in enumerate(SUCURSALES):
+            for i in range(args.productos):
+                # Los productos calientes arrancan con stock de sobra para toda la corrida
+                cantidad = 10_000_000 if i < args.productos_calientes else rng.randint(0, 500)
+                lote.append({"product_id": i + 1, "branch_id": j + 1,
+                             "name": f"producto-{i:07d}", "quantity": cantidad, "branch": branch})
+                if len(lote) >= 5000:
+                    await session.execute(insert(Stock), lote)
+                    lote = []
+        if lote:
+            await session.execute(insert(Stock), lote)
+
+        inicio = datetime.now(timezone.utc) - timedelta(days=180)
+        lote = []
+        for i in range(args.solicitudes):
+            origen, destino = rng.sample(SUCURSALES, 2)
+            lote.append({
+                "producto": f"producto-{rng.randrange(args.productos):07d}",
+                "cantidad": rng.randint(1, 20),
+                "sucursal_origen": origen,
+                "sucursal_destino": destino,
+                "usuario": f"cajero_{origen}_0",
+                "fecha": inicio + timedelta(minutes=i),
+                "estado": "aprobado" if rng.random() < 0.9 else "pendiente",
+            })
+            if len(lote) >= 5000:
+                await session.execute(insert(StockRequest), lote)
+                lote = []
+        if lote:
+            await session.execute(insert(StockRequest), lote)
+        await session.commit()
+
+
+async def correr_escenario(nombre, total, concurrencia, peticion):
+    latencias = []
+    estados = {}
+    errores = 0
+    pendientes = iter(range(total))
+
+    async def trabajador(n):
+        nonlocal errores
+        for i in pendientes:
+            inicio = time.perf_counter()
+            try:
+                status = await peticion(n, i)
+            except Exception:
+                errores += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            estados[status] = estados.get(status, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador(n) for n in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    from benchmarks.reporte import resumen_latencias
+    resultado = {"escenario": nombre, "concurrencia": concurrencia, "errores": errores,
+                 "estados": {str(k): v for k, v in sorted(estados.items())}}
+    resultado.update(resumen_latencias(latencias, duracion))
+    return resultado
+
+
+async def main():
+    args = argumentos()
+    configurar_entorno(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import httpx
+    import main as app_main
+
+    rng = random.Random(args.semilla)
+    inicio = time.perf_counter()
+    await sembrar(args, rng)
+    siembra = time.perf_counter() - inicio
+
+    transporte = httpx.ASGITransport(app=app_main.app)
+
+    def cliente():
+        return httpx.AsyncClient(transport=transporte, base_url="https://bench", timeout=60)
+
+    async def sesion(username):
+        c = cliente()
+        r = await c.post("/token", data={"username": username, "password": PASSWORD})
+        if r.status_code != 303:
+            raise RuntimeError(f"Login fallido para {username}: {r.status_code}")
+        return c
+
+    escenarios = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    desconocidos = set(escenarios) - set(ESCENARIOS)
+    if desconocidos:
+        raise SystemExit(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+    reporte = {
+        "parametros": vars(args),
+        "siembra_s": round(siembra, 2),
+        "escenarios": [],
+    }
+
+    if "login_storm" in escenarios:
+        anonimo = cliente()
+
+        async def login(n, i):
+            branch = SUCURSALES[i % len(SUCURSALES)]
+            r = await anonimo.post("/token", data={"username": f"cajero_{branch}_{i % args.usuarios}", "password": PASSWORD})
+            return r.status_code
+
+        reporte["escenarios"].append(await correr_escenario("login_storm", args.peticiones, args.concurrencia, login))
+        await anonimo.aclose()
+
+    if "ventas_concurrentes" in escenarios:
+        # Un cajero (y cliente) por trabajador, todos en la misma sucursal sobre pocos productos
+        cajeros = [await sesion(f"cajero_{SUCURSALES[0]}_{n % args.usuarios}") for n in range(args.concurrencia)]
+
+        async def venta(n, i):
+            producto = f"producto-{i % args.productos_calientes:07d}"
+            r = await cajeros[n].post("/registrar-venta", data={"producto": producto, "cantidad": 1})
+            return r.status_code
+
+        reporte["escenarios"].append(await correr_escenario("ventas_concurrentes", args.peticiones, args.concurrencia, venta))
+        for c in cajeros:
+            await c.aclose()
+
+    if "dashboard_admin" in escenarios:
+        admin = await sesion("admin_bench")
+
+        async def dashboard(n, i):
+            r = await admin.get("/admin/")
+            return r.status_code
+
+        reporte["escenarios"].append(await correr_escenario("dashboard_admin", args.peticiones, args.concurrencia, dashboard))
+        await admin.aclose()
+
+    if "listado_json" in escenarios:
+        anonimo = cliente()
+        cursores = {}
+
+        async def listado(n, i):
+            # Cada trabajador recorre el catálogo página por página
+            params = {"limit": 100}
+            if cursores.get(n):
+                params["after_id"] = cursores[n]
+            r = await anonimo.get("/stock/", params=params)
+            cursores[n] = r.headers.get("x-next-cursor")
+            return r.status_code
+
+        reporte["escenarios"].append(await correr_escenario("listado_json", args.peticiones, args.concurrencia, listado))
+        await anonimo.aclose()
+
+    salida = json.dumps(reporte, indent=2)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(salida)
+    print(salida)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+"""Utilidades comunes para los reportes de los benchmarks."""
+import statistics
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+#  Resumen de latencias (en segundos) y throughput de un escenario
+def resumen_latencias(latencias, duracion):
+    if not latencias:
+        return {"peticiones": 0, "throughput_rps": 0.0}
+    ms = [l * 1000 for l in latencias]
+    return {
+        "peticiones": len(ms),
+        "duracion_s": round(duracion, 3),
+        "throughput_rps": round(len(ms) / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(percentil(ms, 0.95), 3),
+        "p99_ms": round(percentil(ms, 0.99), 3),
+        "max_ms": round(max(ms), 3),
+    }
@@ -0,0 +1,126 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Optional
+import asyncio
+import time
+
+from models import Stock as StockDB
+from inventario import patron_prefijo
+from config import SEARCH_MODE, SEARCH_TRIGRAM_TTL_SECONDS
+
+MODOS_BUSQUEDA = ("prefijo", "contiene", "fulltext", "trigramas")
+
+# Máximo de ids que devuelve el índice de trigramas para una búsqueda
+MAX_RESULTADOS_TRIGRAMAS = 1000
+
+# =============================================
+# 🔸 Índice de trigramas en memoria (búsqueda por subcadena)
+# =============================================
+
+def _trigramas(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceTrigramas:
+    def __init__(self):
+        self.nombres: dict[int, tuple] = {}  # id -> (nombre en minúsculas, sucursal)
+        self.postings: dict[str, set] = {}
+        self.construido = 0.0
+        self._lock = asyncio.Lock()
+
+    def agregar(self, stock_id: int, nombre: str, branch: Optional[str] = None) -> None:
+        nombre = nombre.lower()
+        self.nombres[stock_id] = (nombre, branch)
+        for trigrama in _trigramas(nombre):
+            self.postings.setdefault(trigrama, set()).add(stock_id)
+
+    def quitar(self, stock_id: int) -> None:
+        entrada = self.nombres.pop(stock_id, None)
+        if entrada is None:
+            return
+        nombre = entrada[0]
+        for trigrama in _trigramas(nombre):
+            ids = self.postings.get(trigrama)
+            if ids is not None:
+                ids.discard(stock_id)
+                if not ids:
+                    del self.postings[trigrama]
+
+    def buscar(self, texto: str, branch: Optional[str] = None, limite: int = MAX_RESULTADOS_TRIGRAMAS) -> list:
+        texto = texto.lower()
+        trigramas = _trigramas(texto)
+        if not trigramas:
+            # Consultas de 1-2 caracteres: recorrido en memoria de los nombres
+            candidatos = self.nombres.keys()
+        else:
+            conjuntos = sorted((self.postings.get(t, set()) for t in trigramas), key=len)
+            candidatos = set.intersection(*conjuntos) if conjuntos[0] else set()
+        encontrados = []
+        for stock_id in candidatos:
+            nombre, sucursal = self.nombres[stock_id]
+            if texto in nombre and (branch is None or sucursal == branch):
+                encontrados.append(stock_id)
+                if len(encontrados) >= limite:
+                    break
+        return encontrados
+
+    #  Carga el índice desde la base si no existe o si venció el TTL
+    async def asegurar(self, session: AsyncSession) -> None:
+        if self.construido and time.monotonic() - self.construido < SEARCH_TRIGRAM_TTL_SECONDS:
+            return
+        async with self._lock:
+            if self.construido and time.monotonic() - self.construido < SEARCH_TRIGRAM_TTL_SECONDS:
+                return
+            result = await session.execute(select(StockDB.id, StockDB.name, StockDB.branch))
+            nuevo = IndiceTrigramas()
+            for stock_id, nombre, branch in result.all():
+                nuevo.agregar(stock_id, nombre, branch)
+            self.nombres, self.postings = nuevo.nombres, nuevo.postings
+            self.construido = time.monotonic()
+
+indice_trigramas = IndiceTrigramas()
+
+#  Mantiene el índice al crear o eliminar productos (si ya está cargado)
+def indexar_producto(stock_id: int, nombre: str, branch: Optional[str]) -> None:
+    if indice_trigramas.construido:
+        indice_trigramas.agregar(stock_id, nombre, branch)
+
+def desindexar_producto(stock_id: int) -> None:
+    if indice_trigramas.construido:
+        indice_trigramas.quitar(stock_id)
+
+#  Fuerza la reconstrucción del índice en la próxima búsqueda (tras cargas masivas)
+def invalidar_indice() -> None:
+    indice_trigramas.construido = 0.0
+
+# =============================================
+# 🔸 Filtro de búsqueda según el modo
+# =============================================
+
+# Operadores del modo booleano de MATCH ... AGAINST: escritos por el usuario
+# pueden cambiar la consulta o hacer que InnoDB la rechace por sintaxis
+OPERADORES_FULLTEXT = str.maketrans({c: " " for c in '+-@"()<>~*'})
+
+#  Cada palabra como prefijo obligatorio en modo booleano: "arr bla" -> "+arr* +bla*"
+def consulta_fulltext(texto: str) -> str:
+    return " ".join(f"+{p}*" for p in texto.translate(OPERADORES_FULLTEXT).split())
+
+#  Condición WHERE para buscar `texto` en el nombre del producto
+async def filtro_busqueda(session: AsyncSession, texto: str, modo: Optional[str] = None, branch: Optional[str] = None):
+    modo = modo or SEARCH_MODE
+    if modo not in MODOS_BUSQUEDA:
+        raise ValueError(f"Modo de búsqueda no válido: {modo}")
+
+    consulta = consulta_fulltext(texto) if modo == "fulltext" else ""
+    if consulta and session.bind.dialect.name == "mysql":
+        return StockDB.name.match(consulta)
+
+    if modo == "trigramas":
+        await indice_trigramas.asegurar(session)
+        return StockDB.id.in_(indice_trigramas.buscar(texto, branch))
+
+    if modo == "contiene":
+        # Comportamiento anterior: no puede usar índices
+        return StockDB.name.ilike(f"%{texto}%")
+
+    # Prefijo: LIKE 'texto%' aprovecha ix_stocks_branch_name (collation *_ci en MySQL)
+    return StockDB.name.like(patron_prefijo(texto), escape="\\")
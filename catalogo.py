@@ -0,0 +1,87 @@
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, Iterable, Optional, Tuple
+
+from models import Product, Branch
+
+# =============================================
+# 🔸 Ids de productos y sucursales (caché en memoria)
+# =============================================
+#
+# Los formularios y la API siguen hablando en nombres; las rutas los traducen
+# a ids una vez y las consultas de inventario buscan por (product_id, branch_id).
+# Los productos y sucursales nunca se renombran ni se borran, así que un id ya
+# resuelto no cambia: la caché solo crece y no necesita invalidación, y una
+# instancia que no conoce un nombre simplemente lo consulta.
+
+class Catalogo:
+    def __init__(self):
+        self.productos: Dict[str, int] = {}
+        self.sucursales: Dict[str, int] = {}
+
+    #  Busca ids por nombre con la sesión o la conexión indicada y los guarda en la caché
+    async def _buscar(self, ejecutor, modelo, columna, cache: dict, nombres: set) -> None:
+        result = await ejecutor.execute(select(columna, modelo.id).where(columna.in_(nombres)))
+        encontrados = dict(result.all())
+        dialecto = ejecutor.dialect if isinstance(ejecutor, AsyncConnection) else ejecutor.bind.dialect
+        if dialecto.name == "mysql":
+            # Collation *_ci: "Arroz" encuentra la fila "arroz"
+            minusculas = {nombre.lower(): id for nombre, id in encontrados.items()}
+            encontrados = {nombre: encontrados.get(nombre, minusculas.get(nombre.lower())) for nombre in nombres}
+        for nombre in nombres:
+            if encontrados.get(nombre) is not None:
+                cache[nombre] = encontrados[nombre]
+
+    async def _crear(self, session: AsyncSession, modelo, columna, campo: str, cache: dict, nombres: set) -> None:
+        # En una transacción propia y confirmada de inmediato: si la del llamador
+        # se revierte, la caché no queda con ids que no existen. Los ids se leen en
+        # la misma conexión: la sesión del llamador puede tener una instantánea
+        # anterior (REPEATABLE READ) que no ve estas filas. Llamar antes de
+        # escribir en la sesión del llamador (SQLite bloquea la base entera).
+        filas = [{campo: nombre} for nombre in sorted(nombres)]
+        async with session.bind.begin() as conn:
+            if conn.dialect.name == "mysql":
+                await conn.execute(mysql.insert(modelo).values(filas).prefix_with("IGNORE"))
+            else:
+                await conn.execute(sqlite.insert(modelo).values(filas).on_conflict_do_nothing())
+            await self._buscar(conn, modelo, columna, cache, nombres)
+
+    async def _resolver(self, session, modelo, columna, campo, cache, nombres, crear) -> None:
+        faltan = {nombre for nombre in nombres if nombre and nombre not in cache}
+        if faltan:
+            await self._buscar(session, modelo, columna, cache, faltan)
+            faltan = {nombre for nombre in faltan if nombre not in cache}
+            if faltan and crear:
+                await self._crear(session, modelo, columna, campo, cache, faltan)
+                faltan = {nombre for nombre in faltan if nombre not in cache}
+                if faltan:
+                    # Nunca se escriben filas con claves NULL
+                    raise RuntimeError(f"No se pudo dar de alta en {modelo.__tablename__}: {', '.join(sorted(faltan))}")
+
+    #  Ids de varios productos y sucursales en a lo sumo una consulta por tipo.
+    #  Con crear=True se dan de alta los que falten (solo en sesiones del primario).
+    async def resolver(
+        self,
+        session: AsyncSession,
+        productos: Iterable[str] = (),
+        sucursales: Iterable[Optional[str]] = (),
+        crear: bool = False,
+    ) -> Tuple[Dict[str, Optional[int]], Dict[str, Optional[int]]]:
+        productos = set(productos)
+        sucursales = set(sucursales)
+        await self._resolver(session, Product, Product.name, "name", self.productos, productos, crear)
+        await self._resolver(session, Branch, Branch.code, "code", self.sucursales, sucursales, crear)
+        return (
+            {nombre: self.productos.get(nombre) for nombre in productos},
+            {codigo: self.sucursales.get(codigo) for codigo in sucursales},
+        )
+
+    #  Atajo para un solo producto en una sucursal: (product_id, branch_id)
+    async def ids(
+        self, session: AsyncSession, producto: str, branch: Optional[str], crear: bool = False
+    ) -> Tuple[Optional[int], Optional[int]]:
+        productos, sucursales = await self.resolver(session, [producto], [branch], crear)
+        return productos.get(producto), sucursales.get(branch)
+
+catalogo = Catalogo()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 #from dotenv import load_dotenv
 
 # Cargar variables de entorno desde .env en local
@@ -12,3 +13,75 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 # Verificación mínima
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY is not set. Define it in .env or Cloud Run environment variables.")
+
+# Hashing de contraseñas (bcrypt fuera del event loop)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+
+# Caché de usuarios autenticados
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+# Si está activo, el rol y la sucursal firmados en el token evitan la consulta del usuario
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+# Búsqueda de productos: contiene | prefijo | fulltext | trigramas
+# "contiene" (subcadena, sin índice) es el comportamiento de siempre; "prefijo"
+# usa el índice pero "rroz" ya no encuentra "arroz", por eso se activa a mano
+SEARCH_MODE = os.getenv("SEARCH_MODE", "contiene")
+# Segundos antes de reconstruir el índice de trigramas en memoria
+SEARCH_TRIGRAM_TTL_SECONDS = float(os.getenv("SEARCH_TRIGRAM_TTL_SECONDS", "300"))
+
+# Importación CSV de inventario
+CSV_IMPORT_BATCH_SIZE = int(os.getenv("CSV_IMPORT_BATCH_SIZE", "1000"))
+CSV_IMPORT_MAX_ERRORS = int(os.getenv("CSV_IMPORT_MAX_ERRORS", "100"))
+
+# Métricas Prometheus en /metrics (sin costo cuando están desactivadas)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Resumen de inventario en memoria
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "5"))
+SUMMARY_TTL_SECONDS = float(os.getenv("SUMMARY_TTL_SECONDS", "300"))
+
+# Plantillas: caché de bytecode compilado y recarga automática (solo desarrollo)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "capirulo-jinja"))
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# ETags de lecturas de stock: segundos máximos que se confía en la versión del
+# libro de movimientos (un movimiento que confirme tarde puede no cambiarla)
+ETAG_VALIDITY_SECONDS = int(os.getenv("ETAG_VALIDITY_SECONDS", "30"))
+
+# Réplica de lectura del inventario: segundos que un usuario sigue leyendo del
+# primario después de escribir (cubre el retraso de replicación)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Verificación del esquema al arrancar:
+#   auto   -> create_all solo si cambió la huella de los modelos (una consulta si no)
+#   crear  -> create_all en cada arranque (comportamiento anterior)
+#   omitir -> nada; las migraciones se aplican aparte (migraciones/)
+SCHEMA_INIT = os.getenv("SCHEMA_INIT", "auto").lower()
+
+# Panel de administración: consultas simultáneas por página (cada una usa su conexión)
+DASHBOARD_QUERY_CONCURRENCY = max(1, int(os.getenv("DASHBOARD_QUERY_CONCURRENCY", "3")))
+
+# Control de admisión (por worker): peticiones simultáneas por clase de ruta y
+# por sucursal, con una cola corta; al desbordar se responde 503/429 con Retry-After
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_LOGIN_LIMIT = int(os.getenv("ADMISSION_LOGIN_LIMIT", str(HASH_WORKERS * 2)))
+ADMISSION_WRITE_LIMIT = int(os.getenv("ADMISSION_WRITE_LIMIT", "64"))
+ADMISSION_READ_LIMIT = int(os.getenv("ADMISSION_READ_LIMIT", "64"))
+ADMISSION_ADMIN_LIMIT = int(os.getenv("ADMISSION_ADMIN_LIMIT", "4"))
+ADMISSION_BRANCH_LIMIT = int(os.getenv("ADMISSION_BRANCH_LIMIT", "32"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+# Agrupación de ventas (group commit): las ventas de una sucursal que llegan
+# dentro de la ventana se aplican en una sola transacción
+SALES_COALESCE_ENABLED = os.getenv("SALES_COALESCE_ENABLED", "false").lower() in ("1", "true", "yes")
+SALES_COALESCE_WINDOW_MS = float(os.getenv("SALES_COALESCE_WINDOW_MS", "5"))
+SALES_COALESCE_MAX_BATCH = int(os.getenv("SALES_COALESCE_MAX_BATCH", "200"))
+
+# Sincronización de terminales (/sync)
+SYNC_KEY_TTL_HOURS = float(os.getenv("SYNC_KEY_TTL_HOURS", "72"))  # Tiempo que se recuerdan las claves
+SYNC_VERSION_OVERLAP = int(os.getenv("SYNC_VERSION_OVERLAP", "500"))  # Ids de movimientos que se repasan
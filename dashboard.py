@@ -0,0 +1,171 @@
+from fastapi import HTTPException, Query, Request
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import asyncio
+import math
+
+from models import Stock as StockDB, StockRequest
+from plantillas import SUCURSALES
+from config import DASHBOARD_QUERY_CONCURRENCY
+
+# =============================================
+# 🔸 Carga paginada de datos para el panel de administración
+# =============================================
+
+#  Fecha de un filtro: el formulario envía "" cuando el campo queda vacío
+def _fecha_filtro(valor: Optional[str], campo: str) -> Optional[date]:
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Fecha no válida en '{campo}': {valor}")
+
+#  Filtros y paginación del panel (dependencia compartida por /admin y /stock/html)
+async def filtros_dashboard(
+    sucursal: Optional[str] = Query(default=None),
+    estado: Optional[str] = Query(default=None, description="pendiente | aprobado"),
+    desde: Optional[str] = Query(default=None, description="AAAA-MM-DD"),
+    hasta: Optional[str] = Query(default=None, description="AAAA-MM-DD"),
+    pagina_productos: int = Query(default=1, ge=1),
+    pagina_solicitudes: int = Query(default=1, ge=1),
+    por_pagina: int = Query(default=50, ge=1, le=500),
+) -> dict:
+    return {
+        "sucursal": sucursal or None,
+        "estado": estado or None,
+        "desde": _fecha_filtro(desde, "desde"),
+        "hasta": _fecha_filtro(hasta, "hasta"),
+        "pagina_productos": pagina_productos,
+        "pagina_solicitudes": pagina_solicitudes,
+        "por_pagina": por_pagina,
+    }
+
+#  Datos de una solicitud para los eventos de stock: el panel la agrega o la
+#  marca como aprobada sin recargar la página
+def datos_solicitud(solicitud: StockRequest) -> dict:
+    return {
+        "id": solicitud.id,
+        "cantidad": solicitud.cantidad,
+        "origen": solicitud.sucursal_origen,
+        "destino": solicitud.sucursal_destino,
+        "usuario": solicitud.usuario,
+        "fecha": solicitud.fecha.strftime("%Y-%m-%d %H:%M"),
+        "dia": solicitud.fecha.date().isoformat(),
+        "estado": solicitud.estado,
+    }
+
+def _paginacion(request: Request, parametro: str, pagina: int, por_pagina: int, total: int) -> dict:
+    paginas = max(1, math.ceil(total / por_pagina))
+    return {
+        "pagina": pagina,
+        "paginas": paginas,
+        "total": total,
+        "anterior": str(request.url.include_query_params(**{parametro: pagina - 1})) if pagina > 1 else None,
+        "siguiente": str(request.url.include_query_params(**{parametro: pagina + 1})) if pagina < paginas else None,
+    }
+
+def _condiciones_productos(filtros: dict, filtro_productos=None) -> list:
+    condiciones = []
+    if filtros["sucursal"]:
+        condiciones.append(StockDB.branch == filtros["sucursal"])
+    if filtro_productos is not None:
+        condiciones.append(filtro_productos)
+    return condiciones
+
+def _condiciones_solicitudes(filtros: dict, con_estado: bool = True) -> list:
+    condiciones = []
+    if con_estado and filtros["estado"]:
+        condiciones.append(StockRequest.estado == filtros["estado"])
+    if filtros["sucursal"]:
+        condiciones.append(
+            (StockRequest.sucursal_origen == filtros["sucursal"])
+            | (StockRequest.sucursal_destino == filtros["sucursal"])
+        )
+    if filtros["desde"]:
+        condiciones.append(StockRequest.fecha >= datetime.combine(filtros["desde"], time.min))
+    if filtros["hasta"]:
+        condiciones.append(StockRequest.fecha < datetime.combine(filtros["hasta"] + timedelta(days=1), time.min))
+    return condiciones
+
+#  Ejecuta consultas independientes a la vez, cada una en su propia sesión (y
+#  conexión), sin pasar de DASHBOARD_QUERY_CONCURRENCY conexiones por página
+async def consultas_concurrentes(fabrica, *consultas):
+    limite = asyncio.Semaphore(DASHBOARD_QUERY_CONCURRENCY)
+
+    async def ejecutar(consulta):
+        async with limite:
+            async with fabrica() as session:
+                return await consulta(session)
+
+    return await asyncio.gather(*(ejecutar(consulta) for consulta in consultas))
+
+#  Contexto del panel: una página de productos, una de solicitudes y contadores
+#  calculados con agregados (sin materializar todas las filas). `fabrica` es el
+#  sessionmaker de lectura; las cuatro consultas corren en paralelo.
+async def cargar_dashboard(
+    fabrica, request: Request, filtros: dict, filtro_productos=None
+) -> dict:
+    por_pagina = filtros["por_pagina"]
+    cond_productos = _condiciones_productos(filtros, filtro_productos)
+    cond_solicitudes = _condiciones_solicitudes(filtros)
+
+    async def contar_productos(session: AsyncSession):
+        result = await session.execute(
+            select(func.count(), func.coalesce(func.sum(StockDB.quantity), 0)).where(*cond_productos)
+        )
+        return result.one()
+
+    async def pagina_productos(session: AsyncSession):
+        result = await session.execute(
+            select(StockDB)
+            .where(*cond_productos)
+            .order_by(StockDB.branch, StockDB.name)
+            .offset((filtros["pagina_productos"] - 1) * por_pagina)
+            .limit(por_pagina)
+        )
+        return result.scalars().all()
+
+    async def contar_solicitudes(session: AsyncSession):
+        result = await session.execute(
+            select(StockRequest.estado, func.count())
+            .where(*_condiciones_solicitudes(filtros, con_estado=False))
+            .group_by(StockRequest.estado)
+        )
+        return {estado: total for estado, total in result.all()}
+
+    async def pagina_solicitudes(session: AsyncSession):
+        result = await session.execute(
+            select(StockRequest)
+            .where(*cond_solicitudes)
+            .order_by(StockRequest.fecha.desc(), StockRequest.id.desc())
+            .offset((filtros["pagina_solicitudes"] - 1) * por_pagina)
+            .limit(por_pagina)
+        )
+        return result.scalars().all()
+
+    (total_productos, unidades), productos, por_estado, solicitudes = await consultas_concurrentes(
+        fabrica, contar_productos, pagina_productos, contar_solicitudes, pagina_solicitudes
+    )
+    if filtros["estado"]:
+        total_solicitudes = por_estado.get(filtros["estado"], 0)
+    else:
+        total_solicitudes = sum(por_estado.values())
+
+    return {
+        "productos": productos,
+        "solicitudes": solicitudes,
+        "filtros": filtros,
+        "sucursales": SUCURSALES,
+        "resumen": {
+            "productos": total_productos,
+            "unidades": unidades,
+            "solicitudes": sum(por_estado.values()),
+            "por_estado": por_estado,
+        },
+        "paginacion_productos": _paginacion(request, "pagina_productos", filtros["pagina_productos"], por_pagina, total_productos),
+        "paginacion_solicitudes": _paginacion(request, "pagina_solicitudes", filtros["pagina_solicitudes"], por_pagina, total_solicitudes),
+    }
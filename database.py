@@ -1,25 +1,108 @@
+from sqlalchemy import exc, text, insert, select, Table, Column, String, DateTime, UniqueConstraint
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from datetime import datetime, timezone
+import asyncio
+import hashlib
 import os
+import time
+
+from config import READ_YOUR_WRITES_SECONDS, SCHEMA_INIT
 
 # Declaración de los Base
 BaseSQL = declarative_base()
 BaseSQLStock = declarative_base()
 
+# Huella del esquema ya aplicado en cada base (ver init_db)
+def _tabla_esquema(metadata):
+    return Table(
+        "schema_version", metadata,
+        Column("huella", String(64), primary_key=True),
+        Column("aplicado", DateTime),
+    )
+
+_esquema_sql = _tabla_esquema(BaseSQL.metadata)
+_esquema_stock = _tabla_esquema(BaseSQLStock.metadata)
+
 # Obtener URLs de conexión desde entorno
 DATABASE_URL_SQL = os.environ.get("DATABASE_URL_SQL")
 DATABASE_URL_SQL_STOCK = os.environ.get("DATABASE_URL_SQL_STOCK")
+# Opcional: réplica de solo lectura del inventario
+DATABASE_URL_SQL_STOCK_REPLICA = os.environ.get("DATABASE_URL_SQL_STOCK_REPLICA")
 
 if not DATABASE_URL_SQL or not DATABASE_URL_SQL_STOCK:
     raise RuntimeError("DATABASE_URL_SQL y DATABASE_URL_SQL_STOCK deben definirse.")
 
+# Pool que mide cuánto esperan las peticiones por una conexión
+class PoolMedido(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            self.checkouts += 1
+            self.espera_total += espera
+            if espera > self.espera_max:
+                self.espera_max = espera
+
+def _env(prefijo: str, nombre: str, defecto: str) -> str:
+    # DB_STOCK_POOL_SIZE tiene prioridad sobre DB_POOL_SIZE (prefijos USERS, STOCK, REPLICA)
+    return os.environ.get(f"DB_{prefijo}_{nombre}", os.environ.get(f"DB_{nombre}", defecto))
+
+def _env_bool(prefijo: str, nombre: str, defecto: str) -> bool:
+    return _env(prefijo, nombre, defecto).lower() in ("1", "true", "yes")
+
+#  Parámetros del motor a partir del entorno (prefijo USERS o STOCK)
+def perfil_engine(prefijo: str, url: str) -> dict:
+    echo = _env(prefijo, "ECHO", "false").lower()
+    perfil = {
+        "echo": "debug" if echo == "debug" else echo in ("1", "true", "yes"),
+        "future": True,
+        "pool_pre_ping": _env_bool(prefijo, "POOL_PRE_PING", "true"),
+        "pool_recycle": int(_env(prefijo, "POOL_RECYCLE", "1800")),
+    }
+    # SQLite en memoria usa su propio pool de una sola conexión
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        return perfil
+    perfil.update({
+        "poolclass": PoolMedido,
+        "pool_size": int(_env(prefijo, "POOL_SIZE", "5")),
+        "max_overflow": int(_env(prefijo, "MAX_OVERFLOW", "10")),
+        "pool_timeout": float(_env(prefijo, "POOL_TIMEOUT", "10")),
+    })
+    if url.startswith("mysql"):
+        perfil["connect_args"] = {"connect_timeout": int(_env(prefijo, "CONNECT_TIMEOUT", "10"))}
+    return perfil
+
 # Crear motores de base de datos
-engine_sql = create_async_engine(DATABASE_URL_SQL, echo=True, future=True)
-engine_stock = create_async_engine(DATABASE_URL_SQL_STOCK, echo=True, future=True)
+engine_sql = create_async_engine(DATABASE_URL_SQL, **perfil_engine("USERS", DATABASE_URL_SQL))
+engine_stock = create_async_engine(DATABASE_URL_SQL_STOCK, **perfil_engine("STOCK", DATABASE_URL_SQL_STOCK))
+engine_stock_replica = (
+    create_async_engine(DATABASE_URL_SQL_STOCK_REPLICA, **perfil_engine("REPLICA", DATABASE_URL_SQL_STOCK_REPLICA))
+    if DATABASE_URL_SQL_STOCK_REPLICA else None
+)
 
 # Crear sessionmakers
 SessionLocal = sessionmaker(bind=engine_sql, class_=AsyncSession, expire_on_commit=False)
 SessionLocalStock = sessionmaker(bind=engine_stock, class_=AsyncSession, expire_on_commit=False)
+# Sin réplica configurada, las lecturas usan el primario
+SessionLocalStockLectura = (
+    sessionmaker(bind=engine_stock_replica, class_=AsyncSession, expire_on_commit=False)
+    if engine_stock_replica is not None else SessionLocalStock
+)
 
 # Dependencia para usuarios
 async def get_session():
@@ -31,10 +114,158 @@ async def get_session_stock():
     async with SessionLocalStock() as session:
         yield session
 
+# =============================================
+# 🔸 Lecturas desde la réplica con "read-your-writes"
+# =============================================
+#
+# Después de una escritura exitosa (POST/PUT/PATCH/DELETE) el middleware deja una
+# cookie con la hora hasta la que ese cliente debe leer del primario, así ve
+# sus propios cambios aunque la réplica vaya atrasada. Funciona entre instancias.
+
+COOKIE_LECTURA_PRIMARIO = "leer_primario"
+_METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+
+class LecturaPrimarioMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in _METODOS_ESCRITURA:
+            return await self.app(scope, receive, send)
+
+        async def send_con_cookie(mensaje):
+            if mensaje["type"] == "http.response.start" and mensaje["status"] < 400:
+                hasta = time.time() + READ_YOUR_WRITES_SECONDS
+                cookie = (
+                    f"{COOKIE_LECTURA_PRIMARIO}={hasta:.3f}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                mensaje = {**mensaje, "headers": list(mensaje.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(mensaje)
+
+        await self.app(scope, receive, send_con_cookie)
+
+def _leer_del_primario(request: Request) -> bool:
+    valor = request.cookies.get(COOKIE_LECTURA_PRIMARIO)
+    if not valor:
+        return False
+    try:
+        return float(valor) > time.time()
+    except ValueError:
+        return False
+
+#  Sessionmaker para lecturas de esta petición (réplica, o primario si acaba de escribir)
+def fabrica_lectura(request: Request):
+    return SessionLocalStock if _leer_del_primario(request) else SessionLocalStockLectura
+
+# Dependencia para endpoints de solo lectura del inventario
+async def get_session_stock_lectura(request: Request):
+    async with fabrica_lectura(request)() as session:
+        yield session
+
+#  Estado de los pools de conexiones (para dimensionar instancias vs. límite de MySQL)
+def pool_stats() -> dict:
+    stats = {}
+    engines = [("users", engine_sql), ("stock", engine_stock)]
+    if engine_stock_replica is not None:
+        engines.append(("stock_replica", engine_stock_replica))
+    for nombre, engine in engines:
+        pool = engine.pool
+        if not isinstance(pool, PoolMedido):
+            stats[nombre] = {"pool": type(pool).__name__}
+            continue
+        stats[nombre] = {
+            "pool": type(pool).__name__,
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "espera_total_s": round(pool.espera_total, 6),
+            "espera_promedio_s": round(pool.espera_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+            "espera_max_s": round(pool.espera_max, 6),
+        }
+    return stats
+
+#  Abre de antemano las conexiones base de cada pool (DB_WARMUP=false lo desactiva),
+#  para que las primeras peticiones no paguen el handshake con MySQL
+async def precalentar_pools() -> None:
+    if os.environ.get("DB_WARMUP", "true").lower() not in ("1", "true", "yes"):
+        return
+
+    async def abrir(engine):
+        conn = await engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    engines = [engine_sql, engine_stock]
+    if engine_stock_replica is not None:
+        engines.append(engine_stock_replica)
+    tareas = []
+    for engine in engines:
+        if isinstance(engine.pool, PoolMedido):
+            tareas += [abrir(engine) for _ in range(engine.pool.size())]
+    # Todas abiertas a la vez (si no, el pool reutilizaría la misma) y luego devueltas al pool
+    conexiones = await asyncio.gather(*tareas, return_exceptions=True)
+    await asyncio.gather(*(c.close() for c in conexiones if not isinstance(c, BaseException)))
+    errores = [c for c in conexiones if isinstance(c, BaseException)]
+    if errores:
+        raise errores[0]
+
 # Inicialización de las bases de datos
-async def init_db():
-    async with engine_sql.begin() as conn:
-        await conn.run_sync(BaseSQL.metadata.create_all)
-    async with engine_stock.begin() as conn:
-        await conn.run_sync(BaseSQLStock.metadata.create_all)
-    print("Bases inicializadas exitosamente.")
+async def _crear_tablas(engine, metadata, intentos: int = 3):
+    for intento in range(intentos):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+            return
+        except (exc.OperationalError, exc.ProgrammingError):
+            # Con varios workers, otro proceso puede crear la misma tabla a la vez;
+            # al reintentar, create_all ya la encuentra y sigue con las demás
+            if intento == intentos - 1:
+                raise
+            await asyncio.sleep(0.2 * (intento + 1))
+
+#  Huella de tablas, columnas, índices y restricciones declarados en los modelos
+def huella_esquema(metadata) -> str:
+    partes = []
+    for tabla in sorted(metadata.tables.values(), key=lambda t: t.name):
+        partes.append(tabla.name)
+        partes += [f"{c.name}:{c.type!r}:{c.nullable}:{c.primary_key}" for c in tabla.columns]
+        partes += sorted(
+            f"ix:{i.name}:{','.join(c.name for c in i.columns)}:{i.unique}" for i in tabla.indexes
+        )
+        partes += sorted(f"uq:{c.name}" for c in tabla.constraints if isinstance(c, UniqueConstraint))
+    return hashlib.sha256("\n".join(partes).encode()).hexdigest()
+
+async def _preparar_base(engine, metadata, tabla) -> str:
+    if SCHEMA_INIT == "omitir":
+        return "omitida"
+    huella = huella_esquema(metadata)
+    if SCHEMA_INIT == "auto":
+        try:
+            async with engine.connect() as conn:
+                vigente = (await conn.execute(select(tabla.c.huella).where(tabla.c.huella == huella))).first()
+            if vigente:
+                return "vigente"
+        except (exc.OperationalError, exc.ProgrammingError):
+            pass  # Base nueva: todavía no existe schema_version
+
+    await _crear_tablas(engine, metadata)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(tabla).values(huella=huella, aplicado=datetime.now(timezone.utc)))
+    except exc.IntegrityError:
+        pass  # Ya registrada (otro worker o modo "crear")
+    return "creada"
+
+#  Crea las tablas que falten según SCHEMA_INIT. Devuelve qué se hizo en cada base.
+async def init_db() -> dict:
+    estado = {
+        "users": await _preparar_base(engine_sql, BaseSQL.metadata, _esquema_sql),
+        "stock": await _preparar_base(engine_stock, BaseSQLStock.metadata, _esquema_stock),
+    }
+    print(f"Bases inicializadas exitosamente ({', '.join(f'{k}: {v}' for k, v in estado.items())}).")
+    return estado
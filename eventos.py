@@ -0,0 +1,66 @@
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+import asyncio
+import json
+import time
+
+# =============================================
+# 🔸 Pub/sub en proceso de cambios de inventario
+# =============================================
+#
+# Cada evento es un dict con al menos "tipo" y "branch". Los cambios de cantidad
+# llevan "producto" y "delta"; las altas llevan "cantidad" absoluta e "id".
+# Tipos: venta, solicitud, transferencia, creado, eliminado, recargar.
+#
+# Los eventos solo llegan a suscriptores de esta instancia; los clientes deben
+# tratar una reconexión como "recargar".
+
+# Eventos pendientes por suscriptor antes de pedirle que recargue la página
+MAX_EVENTOS_PENDIENTES = 100
+
+# branch -> colas de suscriptores; la clave None recibe todas las sucursales (admin)
+_suscriptores: dict[Optional[str], set] = {}
+# Funciones síncronas que reciben cada evento (cachés, contadores, etc.)
+_oyentes: list[Callable[[dict], None]] = []
+
+def registrar_oyente(oyente: Callable[[dict], None]) -> None:
+    _oyentes.append(oyente)
+
+def _entregar(cola: asyncio.Queue, evento: dict) -> None:
+    try:
+        cola.put_nowait(evento)
+    except asyncio.QueueFull:
+        # Cliente lento: se descarta lo pendiente y se le pide recargar
+        while not cola.empty():
+            cola.get_nowait()
+        cola.put_nowait({"tipo": "recargar", "branch": evento.get("branch")})
+
+#  Publica un evento (llamar después del commit que aplicó el cambio)
+def publicar(evento: dict) -> None:
+    evento.setdefault("ts", time.time())
+    for oyente in _oyentes:
+        oyente(evento)
+    for clave in (evento.get("branch"), None):
+        for cola in tuple(_suscriptores.get(clave, ())):
+            _entregar(cola, evento)
+
+#  Atajo para los cambios de cantidad de un producto
+def publicar_cambio(tipo: str, branch: str, producto: str, delta: int, **extra) -> None:
+    publicar({"tipo": tipo, "branch": branch, "producto": producto, "delta": delta, **extra})
+
+@asynccontextmanager
+async def suscribir(branch: Optional[str]):
+    cola: asyncio.Queue = asyncio.Queue(maxsize=MAX_EVENTOS_PENDIENTES)
+    _suscriptores.setdefault(branch, set()).add(cola)
+    try:
+        yield cola
+    finally:
+        colas = _suscriptores.get(branch)
+        if colas is not None:
+            colas.discard(cola)
+            if not colas:
+                del _suscriptores[branch]
+
+#  Formatea un evento como mensaje Server-Sent Events
+def formato_sse(evento: dict) -> str:
+    return f"data: {json.dumps(evento, default=str)}\n\n"
@@ -0,0 +1,233 @@
+from sqlalchemy import update, case, tuple_
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import List, Optional, Tuple
+
+from models import Stock as StockDB, StockRequest
+from movimientos import movimiento, registrar_movimientos
+from catalogo import catalogo
+
+class ConflictoDeStock(Exception):
+    """Otra transacción modificó el stock entre la lectura y el descuento del lote."""
+
+# =============================================
+# 🔸 Operaciones de inventario sobre la tabla stocks
+# =============================================
+#
+# Reciben nombres de producto y sucursal y los traducen a ids con el catálogo
+# en memoria, así las consultas usan la clave única (product_id, branch_id).
+
+#  Descuenta stock con un único UPDATE condicional (sin leer la fila antes).
+#  Devuelve True si había stock suficiente y se descontó. No hace commit.
+async def descontar_stock(session: AsyncSession, producto: str, branch: str, cantidad: int) -> bool:
+    product_id, branch_id = await catalogo.ids(session, producto, branch)
+    if product_id is None or branch_id is None:
+        return False
+    stmt = (
+        update(StockDB)
+        .where(
+            StockDB.product_id == product_id,
+            StockDB.branch_id == branch_id,
+            StockDB.quantity >= cantidad,
+        )
+        .values(quantity=StockDB.quantity - cantidad)
+        .with_dialect_options(mysql_limit=1)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    return result.rowcount > 0
+
+#  Cantidad actual de un producto en una sucursal (None si no existe).
+#  Solo se usa para explicar por qué falló un descuento.
+async def cantidad_actual(session: AsyncSession, producto: str, branch: str) -> Optional[int]:
+    product_id, branch_id = await catalogo.ids(session, producto, branch)
+    if product_id is None or branch_id is None:
+        return None
+    result = await session.execute(
+        select(StockDB.quantity).where(StockDB.product_id == product_id, StockDB.branch_id == branch_id)
+    )
+    return result.scalar_one_or_none()
+
+#  Descuenta un ticket completo de una sucursal en una sola transacción.
+#  Bloquea las filas involucradas con un único SELECT ... FOR UPDATE, valida las
+#  líneas en orden y aplica todos los descuentos con un UPDATE ... CASE.
+#  Devuelve (ok, detalle) por línea; las líneas sin stock no se aplican. No hace commit.
+async def descontar_lote(
+    session: AsyncSession, branch: str, items: List[Tuple[str, int]]
+) -> List[Tuple[bool, Optional[str]]]:
+    productos, sucursales = await catalogo.resolver(session, {producto for producto, _ in items}, [branch])
+    branch_id = sucursales[branch]
+    ids = {id for id in productos.values() if id is not None}
+
+    # Cantidades disponibles por product_id
+    disponible = {}
+    if branch_id is not None and ids:
+        result = await session.execute(
+            select(StockDB.product_id, StockDB.quantity)
+            .where(StockDB.branch_id == branch_id, StockDB.product_id.in_(ids))
+            .with_for_update()
+        )
+        disponible = {product_id: quantity or 0 for product_id, quantity in result.all()}
+
+    resultados = []
+    totales: dict[int, int] = {}
+    for producto, cantidad in items:
+        product_id = productos[producto]
+        if product_id not in disponible:
+            resultados.append((False, "Producto no encontrado en tu sucursal"))
+        elif disponible[product_id] < cantidad:
+            resultados.append((False, f"Stock insuficiente. Solo hay {disponible[product_id]} unidades."))
+        else:
+            disponible[product_id] -= cantidad
+            totales[product_id] = totales.get(product_id, 0) + cantidad
+            resultados.append((True, None))
+
+    if totales:
+        descuento = case(totales, value=StockDB.product_id, else_=0)
+        result = await session.execute(
+            update(StockDB)
+            .where(
+                StockDB.branch_id == branch_id,
+                StockDB.product_id.in_(totales),
+                StockDB.quantity >= descuento,
+            )
+            .values(quantity=StockDB.quantity - descuento)
+            .execution_options(synchronize_session=False)
+        )
+        # Con las filas bloqueadas no debería fallar; si el motor no soporta
+        # FOR UPDATE (p. ej. SQLite) se detecta aquí la escritura concurrente.
+        if result.rowcount != len(totales):
+            raise ConflictoDeStock(branch)
+
+    return resultados
+
+#  Cantidades actuales de varios (producto, sucursal), bloqueando las filas existentes
+async def cantidades_actuales(session: AsyncSession, claves: List[Tuple[str, str]]) -> dict:
+    if not claves:
+        return {}
+    productos, sucursales = await catalogo.resolver(
+        session, {producto for producto, _ in claves}, {branch for _, branch in claves}
+    )
+    por_ids = {
+        (productos[producto], sucursales[branch]): (producto, branch)
+        for producto, branch in claves
+        if productos[producto] is not None and sucursales[branch] is not None
+    }
+    if not por_ids:
+        return {}
+    result = await session.execute(
+        select(StockDB.product_id, StockDB.branch_id, StockDB.quantity)
+        .where(tuple_(StockDB.product_id, StockDB.branch_id).in_(por_ids))
+        .with_for_update()
+    )
+    return {por_ids[(product_id, branch_id)]: quantity or 0 for product_id, branch_id, quantity in result.all()}
+
+#  Patrón LIKE de prefijo con los comodines del texto escapados (usable por índices)
+def patron_prefijo(texto: str) -> str:
+    escapado = texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escapado}%"
+
+#  Inserta o actualiza (por sucursal + nombre) varias filas con un solo INSERT multi-fila.
+#  Da de alta en el catálogo los productos y sucursales nuevos (antes de escribir).
+#  En MySQL usa ON DUPLICATE KEY UPDATE; en SQLite, ON CONFLICT DO UPDATE. No hace commit.
+async def upsert_stock_lote(session: AsyncSession, filas: List[dict]) -> None:
+    if not filas:
+        return
+    productos, sucursales = await catalogo.resolver(
+        session, {fila["name"] for fila in filas}, {fila["branch"] for fila in filas}, crear=True
+    )
+    filas = [
+        {**fila, "product_id": productos[fila["name"]], "branch_id": sucursales[fila["branch"]]}
+        for fila in filas
+    ]
+    if session.bind.dialect.name == "mysql":
+        stmt = mysql.insert(StockDB).values(filas)
+        stmt = stmt.on_duplicate_key_update(
+            quantity=stmt.inserted.quantity,
+            product_id=stmt.inserted.product_id,
+            branch_id=stmt.inserted.branch_id,
+        )
+    else:
+        stmt = sqlite.insert(StockDB).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StockDB.branch, StockDB.name],
+            set_={
+                "quantity": stmt.excluded.quantity,
+                "product_id": stmt.excluded.product_id,
+                "branch_id": stmt.excluded.branch_id,
+            },
+        )
+    await session.execute(stmt)
+
+#  Aprueba solicitudes de transferencia en una sola transacción: carga y bloquea
+#  todas las filas de origen/destino con un único SELECT ... FOR UPDATE y aplica
+#  los movimientos en orden (también en el libro). Las solicitudes deben venir ya bloqueadas.
+#  Devuelve (ok, detalle) por solicitud y los productos creados en destino. No hace commit.
+async def aprobar_solicitudes(
+    session: AsyncSession, solicitudes: List[StockRequest], usuario: Optional[str] = None
+) -> Tuple[List[Tuple[bool, Optional[str]]], List[StockDB]]:
+    # La sucursal destino puede no tener todavía ningún producto: se da de alta
+    productos, sucursales = await catalogo.resolver(
+        session,
+        {solicitud.producto for solicitud in solicitudes},
+        {s for solicitud in solicitudes for s in (solicitud.sucursal_origen, solicitud.sucursal_destino)},
+        crear=True,
+    )
+
+    def clave(producto, branch):
+        return productos[producto], sucursales[branch]
+
+    claves = set()
+    for solicitud in solicitudes:
+        claves.add(clave(solicitud.producto, solicitud.sucursal_origen))
+        claves.add(clave(solicitud.producto, solicitud.sucursal_destino))
+
+    stocks = {}
+    if claves:
+        result = await session.execute(
+            select(StockDB)
+            .where(tuple_(StockDB.product_id, StockDB.branch_id).in_(claves))
+            .with_for_update()
+        )
+        stocks = {(stock.product_id, stock.branch_id): stock for stock in result.scalars().all()}
+
+    resultados = []
+    creados = []
+    movimientos = []
+    for solicitud in solicitudes:
+        if solicitud.estado != "pendiente":
+            resultados.append((False, "Solicitud no válida o ya procesada"))
+            continue
+
+        origen = stocks.get(clave(solicitud.producto, solicitud.sucursal_origen))
+        if not origen or origen.quantity < solicitud.cantidad:
+            resultados.append((False, "Stock insuficiente en sucursal origen"))
+            continue
+        origen.quantity -= solicitud.cantidad
+
+        clave_destino = clave(solicitud.producto, solicitud.sucursal_destino)
+        destino = stocks.get(clave_destino)
+        if destino:
+            destino.quantity += solicitud.cantidad
+        else:
+            destino = StockDB(
+                product_id=clave_destino[0],
+                branch_id=clave_destino[1],
+                name=solicitud.producto,
+                quantity=solicitud.cantidad,
+                branch=solicitud.sucursal_destino
+            )
+            session.add(destino)
+            stocks[clave_destino] = destino
+            creados.append(destino)
+
+        solicitud.estado = "aprobado"
+        resultados.append((True, None))
+        movimientos.append(movimiento("transferencia_salida", solicitud.producto, solicitud.sucursal_origen,
+                                      -solicitud.cantidad, usuario, solicitud.id))
+        movimientos.append(movimiento("transferencia_entrada", solicitud.producto, solicitud.sucursal_destino,
+                                      solicitud.cantidad, usuario, solicitud.id))
+
+    await registrar_movimientos(session, movimientos)
+    return resultados, creados
@@ -1,33 +1,56 @@
+import time
+
+# Inicio del arranque: mide cuánto tardan las importaciones de la app
+_inicio_arranque = time.perf_counter()
+
 from fastapi import FastAPI, Depends, Request, Form, HTTPException, Query, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from contextlib import asynccontextmanager
-import os
 
 from admin_routes import router as admin_router
 from stock_routes import router as stock_router
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_session, init_db
-from auth import create_access_token, get_user, verify_password
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, METRICS_ENABLED, ADMISSION_ENABLED
+from database import get_session, init_db, precalentar_pools, engine_sql, engine_stock, engine_stock_replica, pool_stats, LecturaPrimarioMiddleware
+from auth import create_access_token, authenticate_user, user_claims
 from schemas import User as PydanticUser
 from models import User
-
-# Configuración de plantillas HTML
-templates_path = os.path.join(os.path.dirname(__file__), "templates")
-templates = Jinja2Templates(directory=templates_path)
+from plantillas import templates, precompilar_plantillas
 
 # Inicialización del ciclo de vida de la app
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("⏳ Inicializando aplicación...")
+    # Segundos por fase del arranque (log y gauge app_startup_seconds en /metrics)
+    arranque = {"importacion": _fin_importacion - _inicio_arranque}
+    marca = time.perf_counter()
+
+    def fase(nombre: str) -> None:
+        nonlocal marca
+        ahora = time.perf_counter()
+        arranque[nombre] = ahora - marca
+        marca = ahora
+
+    precompilar_plantillas()
+    fase("plantillas")
     try:
         await init_db()
         print("✅ Base de datos inicializada correctamente.")
     except Exception as e:
         print(f"❌ Error al inicializar la base de datos: {e}")
         raise
+    fase("esquema")
+    # Conexiones abiertas antes de recibir tráfico; si falla, se abrirán bajo demanda
+    try:
+        await precalentar_pools()
+    except Exception as e:
+        print(f"⚠️ No se pudieron precalentar los pools: {e}")
+    fase("pools")
+
+    arranque["total"] = time.perf_counter() - _inicio_arranque
+    app.state.arranque = arranque
+    print("⏱️ Arranque: " + ", ".join(f"{nombre}={segundos:.3f}s" for nombre, segundos in arranque.items()))
     yield
 
 # Instancia principal de la aplicación FastAPI
@@ -37,6 +60,34 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(stock_router, prefix="")
 app.include_router(admin_router, prefix="/admin")
 
+# Tras una escritura, el mismo cliente lee del primario mientras la réplica se pone al día
+if engine_stock_replica is not None:
+    app.add_middleware(LecturaPrimarioMiddleware)
+
+# Control de admisión: cupos por clase de ruta y por sucursal, 429/503 al desbordar
+if ADMISSION_ENABLED:
+    from admision import AdmisionMiddleware
+
+    app.add_middleware(AdmisionMiddleware)
+
+# Métricas de latencia por ruta, consultas SQL y renderizado de plantillas
+if METRICS_ENABLED:
+    import metricas
+
+    app.add_middleware(metricas.MetricasMiddleware)
+    metricas.instrumentar_engine(engine_sql, "users")
+    metricas.instrumentar_engine(engine_stock, "stock")
+    if engine_stock_replica is not None:
+        metricas.instrumentar_engine(engine_stock_replica, "stock_replica")
+    metricas.instrumentar_plantillas(templates)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(
+            metricas.exportar(pool_stats(), getattr(app.state, "arranque", None)),
+            media_type="text/plain; version=0.0.4",
+        )
+
 # Ruta para obtener datos de usuario por ID
 @app.get("/users/{user_id}", response_model=PydanticUser)
 async def get_user_endpoint(user_id: int, session: AsyncSession = Depends(get_session)):
@@ -53,8 +104,8 @@ async def login_access_token(
     password: str = Form(...),
     session: AsyncSession = Depends(get_session)
 ):
-    user = await get_user(session, username=username)
-    if not user or not verify_password(password, user.password_hash):
+    user = await authenticate_user(session, username, password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nombre de usuario o contraseña incorrectos",
@@ -63,7 +114,7 @@ async def login_access_token(
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data=user_claims(user),
         expires_delta=access_token_expires
     )
 
@@ -92,6 +143,9 @@ async def root(request: Request):
 async def debug(local_kw: str = Query(default=None)):
     return {"mensaje": "Ruta debug capturó el parámetro local_kw", "local_kw": local_kw}
 
+# Fin de las importaciones y del registro de rutas
+_fin_importacion = time.perf_counter()
+
 # Ejecución local
 if __name__ == "__main__":
     import uvicorn
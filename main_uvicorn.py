@@ -1,4 +1,89 @@
+import importlib.util
+import math
+import os
+
 import uvicorn
 
+# =============================================
+# 🔸 Lanzador de producción: varios workers de uvicorn
+# =============================================
+#
+# Cada worker es un proceso con su propio event loop, pools de conexiones y
+# estado en memoria, igual que si fueran instancias separadas. Cada uno
+# calienta pools y plantillas en el lifespan antes de aceptar conexiones.
+#
+# Por defecto arranca un solo worker: el bus de eventos (SSE), el resumen de
+# inventario y el índice de trigramas viven en memoria, así que con varios
+# workers un cliente SSE no ve las ventas hechas en otro worker y el resumen
+# y el índice se desactualizan hasta su TTL. Para escalar, más instancias o
+# WEB_CONCURRENCY explícito aceptando esas limitaciones (se avisa al arrancar).
+#
+# Variables de entorno:
+#   PORT (8080), HOST (0.0.0.0)
+#   WEB_CONCURRENCY          workers (1); "auto" usa las CPUs disponibles del contenedor
+#   UVICORN_KEEPALIVE        segundos de keep-alive (75, más que el balanceador de Cloud Run)
+#   UVICORN_BACKLOG          conexiones en espera del socket (2048)
+#   UVICORN_LIMIT_CONCURRENCY  conexiones simultáneas por worker antes de responder 503 (sin límite)
+
+#  CPUs que realmente puede usar el contenedor (cuota de cgroup, afinidad o total)
+def cpus_disponibles() -> int:
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            cuota, periodo = f.read().split()
+        if cuota != "max":
+            return max(1, math.ceil(int(cuota) / int(periodo)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+def _instalado(modulo: str) -> bool:
+    return importlib.util.find_spec(modulo) is not None
+
+def _entero_opcional(nombre: str):
+    valor = os.getenv(nombre)
+    return int(valor) if valor else None
+
+def _workers() -> int:
+    valor = os.getenv("WEB_CONCURRENCY", "1").strip().lower()
+    if valor == "auto":
+        return cpus_disponibles()
+    return max(1, int(valor or "1"))
+
+#  Estado en memoria que no se comparte entre workers (vacío con un solo worker)
+def advertencias(workers: int) -> list:
+    if workers <= 1:
+        return []
+    avisos = [
+        "eventos SSE (/stock/eventos): cada cliente solo ve los cambios de su worker",
+        "resumen de inventario: los cambios de otros workers se ven al vencer SUMMARY_TTL_SECONDS",
+    ]
+    if os.getenv("SEARCH_MODE", "").lower() == "trigramas":
+        avisos.append("índice de trigramas: los productos nuevos de otros workers se ven al vencer SEARCH_TRIGRAM_TTL_SECONDS")
+    return avisos
+
+def configuracion() -> dict:
+    return {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8080")),
+        "workers": _workers(),
+        "loop": "uvloop" if _instalado("uvloop") else "asyncio",
+        "http": "httptools" if _instalado("httptools") else "h11",
+        "timeout_keep_alive": int(os.getenv("UVICORN_KEEPALIVE", "75")),
+        "backlog": int(os.getenv("UVICORN_BACKLOG", "2048")),
+        "limit_concurrency": _entero_opcional("UVICORN_LIMIT_CONCURRENCY"),
+        "proxy_headers": True,
+        "forwarded_allow_ips": "*",
+        "access_log": os.getenv("UVICORN_ACCESS_LOG", "true").lower() in ("1", "true", "yes"),
+    }
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8080)
+    opciones = configuracion()
+    print(
+        f"🚀 {opciones['workers']} worker(s) en {opciones['host']}:{opciones['port']} "
+        f"(loop={opciones['loop']}, http={opciones['http']})"
+    )
+    for aviso in advertencias(opciones["workers"]):
+        print(f"⚠️ Estado por worker: {aviso}")
+    uvicorn.run("main:app", **opciones)
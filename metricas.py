@@ -0,0 +1,198 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+from jinja2 import Template
+from sqlalchemy import event
+
+# =============================================
+# 🔸 Métricas en formato Prometheus (sin dependencias externas)
+# =============================================
+#
+# Con METRICS_ENABLED=false no se instala nada: ni middleware, ni eventos de
+# SQLAlchemy, ni la clase de plantilla medida, así que el costo es cero.
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+class Histograma:
+    __slots__ = ("buckets", "conteos", "suma", "total")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.conteos[bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre: str, etiquetas: str) -> list:
+        separador = "," if etiquetas else ""
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            lineas.append(f'{nombre}_bucket{{{etiquetas}{separador}le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{{etiquetas}{separador}le="+Inf"}} {self.total}')
+        lineas.append(f"{nombre}_sum{{{etiquetas}}} {self.suma}")
+        lineas.append(f"{nombre}_count{{{etiquetas}}} {self.total}")
+        return lineas
+
+class _Registro:
+    def __init__(self):
+        self.duracion: dict[tuple, Histograma] = {}
+        self.peticiones: dict[tuple, int] = {}
+        self.consultas: dict[tuple, Histograma] = {}
+        self.tiempo_db: dict[tuple, Histograma] = {}
+        self.consultas_engine: dict[str, int] = {}
+        self.plantillas: dict[str, Histograma] = {}
+
+    def histograma(self, tabla: dict, clave, buckets) -> Histograma:
+        h = tabla.get(clave)
+        if h is None:
+            h = tabla[clave] = Histograma(buckets)
+        return h
+
+registro = _Registro()
+
+# Contadores de la petición en curso: [consultas, segundos en la base]
+_peticion_actual: ContextVar[Optional[list]] = ContextVar("peticion_actual", default=None)
+
+# =============================================
+# 🔸 Middleware ASGI de tiempos por ruta
+# =============================================
+
+class MetricasMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        contadores = [0, 0.0]
+        token = _peticion_actual.set(contadores)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def send_medido(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _peticion_actual.reset(token)
+            # Plantilla de la ruta (p. ej. /stock/{stock_id}) para no explotar las etiquetas
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            clave = (scope["method"], ruta)
+            registro.histograma(registro.duracion, clave, BUCKETS_SEGUNDOS).observar(duracion)
+            registro.histograma(registro.consultas, clave, BUCKETS_CONSULTAS).observar(contadores[0])
+            registro.histograma(registro.tiempo_db, clave, BUCKETS_SEGUNDOS).observar(contadores[1])
+            clave_estado = clave + (estado,)
+            registro.peticiones[clave_estado] = registro.peticiones.get(clave_estado, 0) + 1
+
+# =============================================
+# 🔸 Eventos de SQLAlchemy: consultas y tiempo de base por petición
+# =============================================
+
+def instrumentar_engine(engine, nombre: str) -> None:
+    sync_engine = engine.sync_engine
+
+    # El inicio va en el contexto de ejecución (uno por sentencia): si la sentencia
+    # falla no llega after_cursor_execute y el contexto se descarta sin dejar restos
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        context._metricas_inicio = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = context._metricas_inicio
+        registro.consultas_engine[nombre] = registro.consultas_engine.get(nombre, 0) + 1
+        contadores = _peticion_actual.get()
+        if contadores is not None:
+            contadores[0] += 1
+            contadores[1] += time.perf_counter() - inicio
+
+# =============================================
+# 🔸 Tiempo de renderizado de plantillas Jinja
+# =============================================
+
+class PlantillaMedida(Template):
+    def render(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            nombre = self.name or "sin_nombre"
+            registro.histograma(registro.plantillas, nombre, BUCKETS_SEGUNDOS).observar(time.perf_counter() - inicio)
+
+    def generate(self, *args, **kwargs):
+        # Respuestas en stream: se mide desde el primer hasta el último fragmento
+        inicio = time.perf_counter()
+        try:
+            yield from super().generate(*args, **kwargs)
+        finally:
+            nombre = self.name or "sin_nombre"
+            registro.histograma(registro.plantillas, nombre, BUCKETS_SEGUNDOS).observar(time.perf_counter() - inicio)
+
+def instrumentar_plantillas(templates) -> None:
+    templates.env.template_class = PlantillaMedida
+
+# =============================================
+# 🔸 Exposición en texto de Prometheus
+# =============================================
+
+def _etiqueta(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def exportar(pools: Optional[dict] = None, arranque: Optional[dict] = None) -> str:
+    lineas = [
+        "# HELP http_request_duration_seconds Latencia de las peticiones por ruta.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (metodo, ruta), h in sorted(registro.duracion.items()):
+        lineas += h.lineas("http_request_duration_seconds", f'method="{metodo}",route="{_etiqueta(ruta)}"')
+
+    lineas += ["# HELP http_requests_total Peticiones atendidas.", "# TYPE http_requests_total counter"]
+    for (metodo, ruta, estado), total in sorted(registro.peticiones.items()):
+        lineas.append(f'http_requests_total{{method="{metodo}",route="{_etiqueta(ruta)}",status="{estado}"}} {total}')
+
+    lineas += ["# HELP db_queries_per_request Consultas SQL por petición.", "# TYPE db_queries_per_request histogram"]
+    for (metodo, ruta), h in sorted(registro.consultas.items()):
+        lineas += h.lineas("db_queries_per_request", f'method="{metodo}",route="{_etiqueta(ruta)}"')
+
+    lineas += ["# HELP db_time_seconds_per_request Tiempo en la base por petición.", "# TYPE db_time_seconds_per_request histogram"]
+    for (metodo, ruta), h in sorted(registro.tiempo_db.items()):
+        lineas += h.lineas("db_time_seconds_per_request", f'method="{metodo}",route="{_etiqueta(ruta)}"')
+
+    lineas += ["# HELP db_queries_total Consultas SQL por motor.", "# TYPE db_queries_total counter"]
+    for nombre, total in sorted(registro.consultas_engine.items()):
+        lineas.append(f'db_queries_total{{engine="{nombre}"}} {total}')
+
+    lineas += ["# HELP template_render_seconds Tiempo de renderizado por plantilla.", "# TYPE template_render_seconds histogram"]
+    for nombre, h in sorted(registro.plantillas.items()):
+        lineas += h.lineas("template_render_seconds", f'template="{_etiqueta(nombre)}"')
+
+    gauges: dict[str, list] = {}
+    for nombre, stats in sorted((pools or {}).items()):
+        for campo, valor in stats.items():
+            if isinstance(valor, (int, float)):
+                gauges.setdefault(campo, []).append(f'db_pool_{campo}{{engine="{nombre}"}} {valor}')
+    for campo, valores in gauges.items():
+        lineas.append(f"# TYPE db_pool_{campo} gauge")
+        lineas += valores
+
+    if arranque:
+        lineas += ["# HELP app_startup_seconds Duración de cada fase del arranque.", "# TYPE app_startup_seconds gauge"]
+        for fase, segundos in arranque.items():
+            lineas.append(f'app_startup_seconds{{phase="{_etiqueta(fase)}"}} {segundos}')
+
+    return "\n".join(lineas) + "\n"
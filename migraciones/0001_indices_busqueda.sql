@@ -0,0 +1,4 @@
+-- Índices de búsqueda de productos (base de inventario).
+-- create_all solo crea índices en tablas nuevas; en bases existentes ejecutar una vez:
+CREATE INDEX ix_stocks_branch_name ON stocks (branch, name);
+CREATE FULLTEXT INDEX ft_stocks_name ON stocks (name);
@@ -0,0 +1,11 @@
+-- Un producto por sucursal (necesario para los upserts de la importación CSV).
+-- 1. Revisar duplicados y consolidarlos antes de crear la restricción:
+SELECT branch, name, COUNT(*) AS filas, SUM(quantity) AS total
+FROM stocks
+GROUP BY branch, name
+HAVING COUNT(*) > 1;
+
+-- 2. Reemplazar el índice compuesto por la restricción única:
+ALTER TABLE stocks
+    DROP INDEX ix_stocks_branch_name,
+    ADD CONSTRAINT uq_stocks_branch_name UNIQUE (branch, name);
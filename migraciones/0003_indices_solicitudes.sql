@@ -0,0 +1,3 @@
+-- Índices del historial de solicitudes para el panel paginado (base de inventario).
+CREATE INDEX ix_stock_requests_estado_fecha ON stock_requests (estado, fecha);
+CREATE INDEX ix_stock_requests_fecha ON stock_requests (fecha);
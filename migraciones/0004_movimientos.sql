@@ -0,0 +1,28 @@
+-- Libro de movimientos de stock y totales diarios (base de inventario).
+-- El historial empieza con esta migración: no hay movimientos anteriores.
+CREATE TABLE stock_movements (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    fecha DATETIME NOT NULL,
+    tipo VARCHAR(30) NOT NULL,
+    producto VARCHAR(100) NOT NULL,
+    branch VARCHAR(50) NOT NULL,
+    delta INT NOT NULL,
+    usuario VARCHAR(100) NULL,
+    referencia INT NULL
+);
+CREATE INDEX ix_stock_movements_fecha ON stock_movements (fecha);
+CREATE INDEX ix_stock_movements_branch_fecha ON stock_movements (branch, fecha);
+CREATE INDEX ix_stock_movements_producto_fecha ON stock_movements (producto, fecha);
+
+CREATE TABLE stock_movements_daily (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    dia DATE NOT NULL,
+    branch VARCHAR(50) NOT NULL,
+    producto VARCHAR(100) NOT NULL,
+    tipo VARCHAR(30) NOT NULL,
+    delta INT NOT NULL DEFAULT 0,
+    movimientos INT NOT NULL DEFAULT 0,
+    CONSTRAINT uq_stock_movements_daily UNIQUE (dia, branch, producto, tipo)
+);
+CREATE INDEX ix_stock_movements_daily_branch_dia ON stock_movements_daily (branch, dia);
+CREATE INDEX ix_stock_movements_daily_producto_dia ON stock_movements_daily (producto, dia);
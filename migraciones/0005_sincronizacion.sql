@@ -0,0 +1,13 @@
+-- Sincronización de terminales: idempotencia y cambios por sucursal desde una versión.
+CREATE INDEX ix_stock_movements_branch_id ON stock_movements (branch, id);
+
+CREATE TABLE sync_operations (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    branch VARCHAR(50) NOT NULL,
+    clave VARCHAR(64) NOT NULL,
+    ok BOOL NOT NULL,
+    detalle VARCHAR(255) NULL,
+    fecha DATETIME NOT NULL,
+    CONSTRAINT uq_sync_operations_branch_clave UNIQUE (branch, clave)
+);
+CREATE INDEX ix_sync_operations_fecha ON sync_operations (fecha);
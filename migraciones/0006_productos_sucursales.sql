@@ -0,0 +1,57 @@
+-- Catálogo de productos y sucursales con claves enteras (base de inventario).
+-- stocks y stock_requests conservan las columnas de texto; las nuevas claves
+-- se rellenan a partir de ellas. Aplicar antes de desplegar la versión que
+-- busca por (product_id, branch_id): create_all no agrega columnas.
+CREATE TABLE branches (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    code VARCHAR(50) NOT NULL,
+    nombre VARCHAR(100) NULL,
+    CONSTRAINT uq_branches_code UNIQUE (code)
+);
+
+CREATE TABLE products (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    CONSTRAINT uq_products_name UNIQUE (name)
+);
+
+INSERT IGNORE INTO branches (code)
+    SELECT DISTINCT branch FROM stocks WHERE branch IS NOT NULL
+    UNION SELECT DISTINCT sucursal_origen FROM stock_requests
+    UNION SELECT DISTINCT sucursal_destino FROM stock_requests;
+
+INSERT IGNORE INTO products (name)
+    SELECT DISTINCT name FROM stocks
+    UNION SELECT DISTINCT producto FROM stock_requests;
+
+-- Inventario
+ALTER TABLE stocks
+    ADD COLUMN product_id INT NULL AFTER id,
+    ADD COLUMN branch_id INT NULL AFTER product_id;
+
+UPDATE stocks s
+    JOIN products p ON p.name = s.name
+    JOIN branches b ON b.code = s.branch
+    SET s.product_id = p.id, s.branch_id = b.id;
+
+ALTER TABLE stocks
+    ADD CONSTRAINT uq_stocks_product_branch UNIQUE (product_id, branch_id),
+    ADD CONSTRAINT fk_stocks_product FOREIGN KEY (product_id) REFERENCES products (id),
+    ADD CONSTRAINT fk_stocks_branch FOREIGN KEY (branch_id) REFERENCES branches (id);
+
+-- Solicitudes
+ALTER TABLE stock_requests
+    ADD COLUMN producto_id INT NULL AFTER sucursal_destino,
+    ADD COLUMN origen_id INT NULL AFTER producto_id,
+    ADD COLUMN destino_id INT NULL AFTER origen_id;
+
+UPDATE stock_requests r
+    JOIN products p ON p.name = r.producto
+    JOIN branches o ON o.code = r.sucursal_origen
+    JOIN branches d ON d.code = r.sucursal_destino
+    SET r.producto_id = p.id, r.origen_id = o.id, r.destino_id = d.id;
+
+ALTER TABLE stock_requests
+    ADD CONSTRAINT fk_stock_requests_producto FOREIGN KEY (producto_id) REFERENCES products (id),
+    ADD CONSTRAINT fk_stock_requests_origen FOREIGN KEY (origen_id) REFERENCES branches (id),
+    ADD CONSTRAINT fk_stock_requests_destino FOREIGN KEY (destino_id) REFERENCES branches (id);
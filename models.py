@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, ForeignKey, Index, UniqueConstraint
 from datetime import datetime, timezone
 from database import BaseSQL, BaseSQLStock
 
@@ -15,17 +15,44 @@ class User(BaseSQL):
     role = Column(String(20), default="user")
     branch = Column(String(50), default="soacha")
 
+# ===========================
+# Catálogo de productos y sucursales (claves enteras)
+# ===========================
+class Product(BaseSQLStock):
+    __tablename__ = "products"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+class Branch(BaseSQLStock):
+    __tablename__ = "branches"
+    id = Column(Integer, primary_key=True)
+    code = Column(String(50), nullable=False, unique=True)  # Valor de User.branch, p. ej. "soacha"
+    nombre = Column(String(100), nullable=True)
+
 # ===========================
 # Modelo de Inventario
 # ===========================
 class Stock(BaseSQLStock):
     __tablename__ = "stocks"
     id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=True)
+    # Copias del nombre y la sucursal para listados, búsquedas y plantillas
     name = Column(String(100), nullable=False)
     quantity = Column(Integer, default=0)
     branch = Column(String(50), nullable=True)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # Ventas, solicitudes y aprobaciones buscan por estas claves enteras
+        UniqueConstraint("product_id", "branch_id", name="uq_stocks_product_branch"),
+        # Un nombre por sucursal; sirve para búsquedas por prefijo y para los
+        # upserts de la importación CSV
+        UniqueConstraint("branch", "name", name="uq_stocks_branch_name"),
+        # Búsqueda por subcadena en MySQL (SEARCH_MODE=fulltext)
+        Index("ft_stocks_name", "name", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
 # ===========================
 # Modelo de Solicitudes de Stock
 # ===========================
@@ -36,6 +63,74 @@ class StockRequest(BaseSQLStock):
     cantidad = Column(Integer, nullable=False)
     sucursal_origen = Column(String(50), nullable=False)
     sucursal_destino = Column(String(50), nullable=False)
+    producto_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    origen_id = Column(Integer, ForeignKey("branches.id"), nullable=True)
+    destino_id = Column(Integer, ForeignKey("branches.id"), nullable=True)
     usuario = Column(String(100), nullable=False)
     fecha = Column(DateTime, default=datetime.now(timezone.utc))
     estado = Column(String(20), default="pendiente")  # Nuevo campo
+
+    __table_args__ = (
+        # Panel de administración: filtro por estado ordenado por fecha
+        Index("ix_stock_requests_estado_fecha", "estado", "fecha"),
+        Index("ix_stock_requests_fecha", "fecha"),
+    )
+
+# ===========================
+# Libro de movimientos de stock (solo inserción)
+# ===========================
+class StockMovement(BaseSQLStock):
+    __tablename__ = "stock_movements"
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, nullable=False)  # UTC
+    tipo = Column(String(30), nullable=False)  # venta, solicitud, transferencia_salida, ...
+    producto = Column(String(100), nullable=False)
+    branch = Column(String(50), nullable=False)
+    delta = Column(Integer, nullable=False)  # Negativo si sale stock
+    usuario = Column(String(100), nullable=True)
+    referencia = Column(Integer, nullable=True)  # id de la solicitud, si aplica
+
+    __table_args__ = (
+        # Consultas por periodo, por sucursal o por producto con rangos de fecha
+        Index("ix_stock_movements_fecha", "fecha"),
+        Index("ix_stock_movements_branch_fecha", "branch", "fecha"),
+        Index("ix_stock_movements_producto_fecha", "producto", "fecha"),
+        # Sincronización de terminales: cambios de una sucursal desde una versión (id)
+        Index("ix_stock_movements_branch_id", "branch", "id"),
+    )
+
+# ===========================
+# Totales diarios de movimientos (se actualizan junto con el libro)
+# ===========================
+class StockMovementDaily(BaseSQLStock):
+    __tablename__ = "stock_movements_daily"
+    id = Column(Integer, primary_key=True)
+    dia = Column(Date, nullable=False)  # Día UTC
+    branch = Column(String(50), nullable=False)
+    producto = Column(String(100), nullable=False)
+    tipo = Column(String(30), nullable=False)
+    delta = Column(Integer, nullable=False, default=0)
+    movimientos = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("dia", "branch", "producto", "tipo", name="uq_stock_movements_daily"),
+        Index("ix_stock_movements_daily_branch_dia", "branch", "dia"),
+        Index("ix_stock_movements_daily_producto_dia", "producto", "dia"),
+    )
+
+# ===========================
+# Operaciones ya aplicadas por las terminales (idempotencia de /sync)
+# ===========================
+class SyncOperation(BaseSQLStock):
+    __tablename__ = "sync_operations"
+    id = Column(Integer, primary_key=True)
+    branch = Column(String(50), nullable=False)
+    clave = Column(String(64), nullable=False)
+    ok = Column(Boolean, nullable=False)
+    detalle = Column(String(255), nullable=True)
+    fecha = Column(DateTime, nullable=False)  # UTC; se purgan pasado SYNC_KEY_TTL_HOURS
+
+    __table_args__ = (
+        UniqueConstraint("branch", "clave", name="uq_sync_operations_branch_clave"),
+        Index("ix_sync_operations_fecha", "fecha"),
+    )
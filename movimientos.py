@@ -0,0 +1,158 @@
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
+
+from models import StockMovement, StockMovementDaily
+
+# =============================================
+# 🔸 Libro de movimientos de stock y totales diarios
+# =============================================
+#
+# Cada cambio de cantidad deja una fila en stock_movements, en la misma
+# transacción que el UPDATE de stocks. Los totales por día, sucursal, producto
+# y tipo se acumulan en stock_movements_daily con un upsert, así que los
+# reportes por periodo leen pocas filas en vez de recorrer el libro.
+
+TIPOS_MOVIMIENTO = (
+    "venta",                  # Venta en caja
+    "solicitud",              # Reserva al solicitar stock a otra sucursal
+    "transferencia_salida",   # Aprobación: sale de la sucursal origen
+    "transferencia_entrada",  # Aprobación: entra a la sucursal destino
+    "alta",                   # Producto creado
+    "baja",                   # Producto eliminado
+    "importacion",            # Ajuste por importación CSV
+)
+
+# Dimensiones por las que se puede agrupar el reporte de periodo
+AGRUPACIONES = {
+    "dia": StockMovementDaily.dia,
+    "branch": StockMovementDaily.branch,
+    "producto": StockMovementDaily.producto,
+    "tipo": StockMovementDaily.tipo,
+}
+
+def movimiento(
+    tipo: str, producto: str, branch: Optional[str], delta: int,
+    usuario: Optional[str] = None, referencia: Optional[int] = None
+) -> dict:
+    return {
+        "tipo": tipo,
+        "producto": producto,
+        "branch": branch or "",
+        "delta": delta,
+        "usuario": usuario,
+        "referencia": referencia,
+    }
+
+#  Escribe varios movimientos con un INSERT multi-fila y acumula los totales
+#  diarios con un solo upsert. Los movimientos con delta 0 se ignoran, salvo altas
+#  y bajas (las terminales se enteran por ellos de productos nuevos o eliminados). No hace commit.
+async def registrar_movimientos(session: AsyncSession, movimientos: List[dict]) -> None:
+    # Fecha UTC sin zona, igual para todo el lote (y para su total diario)
+    fecha = datetime.now(timezone.utc).replace(tzinfo=None)
+    filas = [{**m, "fecha": fecha} for m in movimientos if m["delta"] or m["tipo"] in ("alta", "baja")]
+    if not filas:
+        return
+    await session.execute(insert(StockMovement), filas)
+
+    totales: dict[tuple, list] = {}
+    for fila in filas:
+        total = totales.setdefault((fila["branch"], fila["producto"], fila["tipo"]), [0, 0])
+        total[0] += fila["delta"]
+        total[1] += 1
+    # Siempre en el mismo orden para que dos transacciones no se bloqueen entre sí
+    diarios = [
+        {"dia": fecha.date(), "branch": branch, "producto": producto, "tipo": tipo,
+         "delta": delta, "movimientos": cantidad}
+        for (branch, producto, tipo), (delta, cantidad) in sorted(totales.items())
+    ]
+    if session.bind.dialect.name == "mysql":
+        stmt = mysql.insert(StockMovementDaily).values(diarios)
+        stmt = stmt.on_duplicate_key_update(
+            delta=StockMovementDaily.delta + stmt.inserted.delta,
+            movimientos=StockMovementDaily.movimientos + stmt.inserted.movimientos,
+        )
+    else:
+        stmt = sqlite.insert(StockMovementDaily).values(diarios)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StockMovementDaily.dia, StockMovementDaily.branch,
+                            StockMovementDaily.producto, StockMovementDaily.tipo],
+            set_={
+                "delta": StockMovementDaily.delta + stmt.excluded.delta,
+                "movimientos": StockMovementDaily.movimientos + stmt.excluded.movimientos,
+            },
+        )
+    await session.execute(stmt)
+
+#  Totales de un periodo desde los buckets diarios, agrupados por las dimensiones pedidas
+async def resumen_periodo(
+    session: AsyncSession,
+    desde: date,
+    hasta: date,
+    agrupar: List[str],
+    branch: Optional[str] = None,
+    producto: Optional[str] = None,
+    tipo: Optional[str] = None,
+    limite: int = 1000,
+) -> List[dict]:
+    columnas = [AGRUPACIONES[campo] for campo in agrupar]
+    stmt = (
+        select(
+            *columnas,
+            func.sum(StockMovementDaily.delta).label("delta"),
+            func.sum(StockMovementDaily.movimientos).label("movimientos"),
+        )
+        .where(StockMovementDaily.dia >= desde, StockMovementDaily.dia <= hasta)
+        .group_by(*columnas)
+        .order_by(*columnas)
+        .limit(limite)
+    )
+    if branch:
+        stmt = stmt.where(StockMovementDaily.branch == branch)
+    if producto:
+        stmt = stmt.where(StockMovementDaily.producto == producto)
+    if tipo:
+        stmt = stmt.where(StockMovementDaily.tipo == tipo)
+
+    resultado = []
+    for fila in (await session.execute(stmt)).all():
+        item = dict(zip(agrupar, fila))
+        if "dia" in item:
+            item["dia"] = item["dia"].isoformat()
+        item["delta"] = int(fila.delta or 0)
+        item["movimientos"] = int(fila.movimientos or 0)
+        resultado.append(item)
+    return resultado
+
+#  Página del libro en un rango de fechas (cursor por id)
+async def listar_movimientos(
+    session: AsyncSession,
+    desde: date,
+    hasta: date,
+    limite: int,
+    after_id: Optional[int] = None,
+    branch: Optional[str] = None,
+    producto: Optional[str] = None,
+    tipo: Optional[str] = None,
+) -> List[StockMovement]:
+    stmt = (
+        select(StockMovement)
+        .where(
+            StockMovement.fecha >= datetime.combine(desde, time.min),
+            StockMovement.fecha < datetime.combine(hasta + timedelta(days=1), time.min),
+        )
+        .order_by(StockMovement.id)
+        .limit(limite)
+    )
+    if after_id is not None:
+        stmt = stmt.where(StockMovement.id > after_id)
+    if branch:
+        stmt = stmt.where(StockMovement.branch == branch)
+    if producto:
+        stmt = stmt.where(StockMovement.producto == producto)
+    if tipo:
+        stmt = stmt.where(StockMovement.tipo == tipo)
+    return (await session.execute(stmt)).scalars().all()
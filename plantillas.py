@@ -0,0 +1,62 @@
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+import os
+
+from config import TEMPLATE_CACHE_DIR, TEMPLATE_AUTO_RELOAD
+
+# =============================================
+# 🔸 Entorno Jinja compartido por toda la app
+# =============================================
+
+templates_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+templates = Jinja2Templates(directory=templates_path)
+
+# Bytecode precompilado en disco: los workers nuevos no vuelven a compilar las plantillas
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+# Sin auto_reload Jinja no hace un stat() del archivo en cada petición
+templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+
+# Sucursales con página propia (plantilla branch.html) y su nombre visible
+SUCURSALES = {
+    "soacha": "Soacha",
+    "suba": "Suba",
+    "centro": "Centro",
+    "cedritos": "Cedritos",
+    "sanmateo": "San Mateo",
+}
+
+PLANTILLAS = ("login.html", "branch.html", "administration.html", "usuarios_admin.html")
+
+#  Carga (y compila) todas las plantillas; falla al arrancar si falta alguna
+def precompilar_plantillas() -> None:
+    for nombre in PLANTILLAS:
+        templates.get_template(nombre)
+
+# Tamaño mínimo de cada bloque enviado al navegador
+TAMANO_BLOQUE_HTML = 16 * 1024
+
+def _agrupar(partes):
+    # generate() produce muchos fragmentos pequeños; se agrupan para no pagar un
+    # salto al threadpool por cada uno
+    bloque = []
+    tamano = 0
+    for parte in partes:
+        bloque.append(parte)
+        tamano += len(parte)
+        if tamano >= TAMANO_BLOQUE_HTML:
+            yield "".join(bloque)
+            bloque = []
+            tamano = 0
+    if bloque:
+        yield "".join(bloque)
+
+#  Respuesta HTML renderizada por partes: la tabla empieza a llegar antes de terminar
+def respuesta_stream(nombre: str, contexto: dict, status_code: int = 200) -> StreamingResponse:
+    plantilla = templates.get_template(nombre)
+    return StreamingResponse(
+        _agrupar(plantilla.generate(contexto)),
+        status_code=status_code,
+        media_type="text/html",
+    )
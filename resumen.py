@@ -0,0 +1,122 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Optional
+import asyncio
+import heapq
+import time
+
+from models import Stock as StockDB
+from eventos import registrar_oyente
+from config import LOW_STOCK_THRESHOLD, SUMMARY_TTL_SECONDS
+
+# =============================================
+# 🔸 Resumen de inventario en memoria, mantenido con los eventos de stock
+# =============================================
+#
+# Se carga una vez con un solo SELECT y luego se actualiza con cada evento de
+# eventos.publicar (ventas, solicitudes, transferencias, altas y bajas), así que
+# las consultas de totales y alertas no tocan la base. Como los eventos son por
+# instancia, el resumen se recarga completo cada SUMMARY_TTL_SECONDS.
+
+class ResumenInventario:
+    def __init__(self):
+        self.cantidades: dict[tuple, int] = {}  # (producto, sucursal) -> cantidad
+        self.por_sucursal: dict[Optional[str], dict] = {}
+        self.por_producto: dict[str, dict] = {}
+        self.bajo_stock: set = set()
+        self.cargado = 0.0
+        self.cargando = False
+        self.desactualizado = False
+        self._lock = asyncio.Lock()
+
+    def _sumar(self, producto: str, branch: Optional[str], delta: int, filas: int) -> None:
+        sucursal = self.por_sucursal.setdefault(branch, {"productos": 0, "unidades": 0})
+        sucursal["productos"] += filas
+        sucursal["unidades"] += delta
+        total = self.por_producto.setdefault(producto, {"sucursales": 0, "unidades": 0})
+        total["sucursales"] += filas
+        total["unidades"] += delta
+        if total["sucursales"] == 0:
+            del self.por_producto[producto]
+        if sucursal["productos"] == 0:
+            del self.por_sucursal[branch]
+
+    def _fijar(self, producto: str, branch: Optional[str], cantidad: Optional[int]) -> None:
+        clave = (producto, branch)
+        anterior = self.cantidades.get(clave)
+        if cantidad is None:
+            if anterior is not None:
+                del self.cantidades[clave]
+                self._sumar(producto, branch, -anterior, -1)
+            self.bajo_stock.discard(clave)
+            return
+        self.cantidades[clave] = cantidad
+        self._sumar(producto, branch, cantidad - (anterior or 0), 0 if anterior is not None else 1)
+        if cantidad <= LOW_STOCK_THRESHOLD:
+            self.bajo_stock.add(clave)
+        else:
+            self.bajo_stock.discard(clave)
+
+    #  Oyente de eventos: aplica el cambio en O(1)
+    def aplicar(self, evento: dict) -> None:
+        if self.cargando:
+            # La carga en curso puede o no incluir este cambio: se recarga de nuevo
+            self.desactualizado = True
+            return
+        if not self.cargado:
+            return
+        tipo = evento["tipo"]
+        clave = (evento.get("producto"), evento.get("branch"))
+        if tipo == "creado":
+            self._fijar(clave[0], clave[1], evento["cantidad"])
+        elif tipo == "eliminado":
+            self._fijar(clave[0], clave[1], None)
+        elif "delta" in evento and clave in self.cantidades:
+            self._fijar(clave[0], clave[1], self.cantidades[clave] + evento["delta"])
+        else:
+            # Cargas masivas o cambios sobre filas desconocidas
+            self.desactualizado = True
+
+    def vigente(self) -> bool:
+        return bool(self.cargado) and not self.desactualizado and time.monotonic() - self.cargado < SUMMARY_TTL_SECONDS
+
+    #  Carga (o recarga) el resumen completo si no está vigente
+    async def asegurar(self, session: AsyncSession) -> None:
+        if self.vigente():
+            return
+        async with self._lock:
+            if self.vigente():
+                return
+            self.cargando = True
+            self.desactualizado = False
+            try:
+                result = await session.execute(select(StockDB.name, StockDB.branch, StockDB.quantity))
+                nuevo = ResumenInventario()
+                for nombre, branch, cantidad in result.all():
+                    nuevo._fijar(nombre, branch, cantidad or 0)
+                self.cantidades = nuevo.cantidades
+                self.por_sucursal = nuevo.por_sucursal
+                self.por_producto = nuevo.por_producto
+                self.bajo_stock = nuevo.bajo_stock
+                self.cargado = time.monotonic()
+            finally:
+                self.cargando = False
+
+    def totales(self) -> dict:
+        return {
+            "productos": len(self.cantidades),
+            "unidades": sum(s["unidades"] for s in self.por_sucursal.values()),
+            "bajo_stock": len(self.bajo_stock),
+        }
+
+    #  Las `limite` alertas con menos stock (bajo_stock no tiene orden)
+    def alertas(self, branch: Optional[str] = None, limite: int = 100) -> list:
+        alertas = (
+            {"producto": producto, "branch": sucursal, "quantity": self.cantidades[(producto, sucursal)]}
+            for producto, sucursal in self.bajo_stock
+            if branch is None or sucursal == branch
+        )
+        return heapq.nsmallest(limite, alertas, key=lambda a: (a["quantity"], a["branch"] or "", a["producto"]))
+
+resumen_inventario = ResumenInventario()
+registrar_oyente(resumen_inventario.aplicar)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 # =======================
@@ -80,3 +80,75 @@ class StockRequest(BaseModel):
 
     class Config:
         orm_mode = True
+
+class AprobacionLote(BaseModel):
+    # Ids concretos, o todas las pendientes filtrando por sucursal de origen/destino
+    ids: Optional[List[int]] = Field(None, min_items=1, max_items=5000)
+    sucursal_origen: Optional[str] = None
+    sucursal_destino: Optional[str] = None
+    limite: int = Field(1000, ge=1, le=5000)
+
+class AprobacionResultado(BaseModel):
+    id: int
+    ok: bool
+    detalle: Optional[str] = None
+
+class AprobacionLoteResultado(BaseModel):
+    aprobadas: int
+    rechazadas: int
+    resultados: List[AprobacionResultado]
+
+
+# =======================
+# 🔹 Ventas por lote (terminales de punto de venta)
+# =======================
+
+class VentaItem(BaseModel):
+    producto: str = Field(..., min_length=1, max_length=100)
+    cantidad: int = Field(..., ge=1)
+
+class VentaLote(BaseModel):
+    items: List[VentaItem] = Field(..., min_items=1, max_items=500)
+
+class VentaLineaResultado(BaseModel):
+    producto: str
+    cantidad: int
+    ok: bool
+    detalle: Optional[str] = None
+
+class VentaLoteResultado(BaseModel):
+    aplicadas: int
+    rechazadas: int
+    lineas: List[VentaLineaResultado]
+
+
+# =======================
+# 🔹 Sincronización de terminales (offline)
+# =======================
+
+class SyncOperacion(BaseModel):
+    # Clave generada por la terminal (p. ej. UUID); reenviarla no vuelve a aplicar la venta
+    clave: str = Field(..., min_length=8, max_length=64)
+    producto: str = Field(..., min_length=1, max_length=100)
+    cantidad: int = Field(..., ge=1)
+
+class SyncPeticion(BaseModel):
+    # Versión devuelta por la última sincronización (0 = catálogo completo de la sucursal)
+    version: int = Field(0, ge=0)
+    operaciones: List[SyncOperacion] = Field(default_factory=list, max_items=500)
+
+class SyncResultadoOperacion(BaseModel):
+    clave: str
+    ok: bool
+    detalle: Optional[str] = None
+    duplicada: bool = False
+
+class SyncProducto(BaseModel):
+    producto: str
+    quantity: Optional[int] = None  # None si el producto ya no existe en la sucursal
+
+class SyncRespuesta(BaseModel):
+    version: int
+    completo: bool
+    resultados: List[SyncResultadoOperacion]
+    productos: List[SyncProducto]
@@ -0,0 +1,113 @@
+from sqlalchemy import delete, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import time
+
+from models import Stock as StockDB, StockMovement, SyncOperation
+from inventario import descontar_lote
+from movimientos import movimiento, registrar_movimientos
+from config import SYNC_KEY_TTL_HOURS, SYNC_VERSION_OVERLAP
+
+# =============================================
+# 🔸 Sincronización de terminales de sucursal
+# =============================================
+#
+# La terminal envía las ventas acumuladas sin conexión, cada una con una clave
+# propia. Las claves ya vistas devuelven el resultado guardado (no se vuelve a
+# descontar); las nuevas se aplican juntas con descontar_lote. La respuesta
+# trae solo los productos de la sucursal que cambiaron desde la versión de la
+# terminal: la versión es el id del libro de movimientos (stock_movements).
+
+# Cada cuánto se purgan las claves vencidas (por proceso) y cuántas por vez
+INTERVALO_PURGA_SEGUNDOS = 60
+PURGA_MAX_FILAS = 5000
+_ultima_purga = 0.0
+
+#  Aplica las operaciones nuevas de la terminal y registra sus claves. No hace commit.
+#  Devuelve por operación (en el orden recibido): (clave, ok, detalle, duplicada) y
+#  las ventas aplicadas [(producto, cantidad)] para publicar después del commit.
+async def aplicar_operaciones(
+    session: AsyncSession, branch: str, usuario: Optional[str], operaciones: list
+) -> Tuple[List[tuple], List[Tuple[str, int]]]:
+    claves = list(dict.fromkeys(op.clave for op in operaciones))
+    previas = {}
+    if claves:
+        result = await session.execute(
+            select(SyncOperation.clave, SyncOperation.ok, SyncOperation.detalle)
+            .where(SyncOperation.branch == branch, SyncOperation.clave.in_(claves))
+        )
+        previas = {clave: (ok, detalle) for clave, ok, detalle in result.all()}
+
+    # Solo la primera aparición de cada clave nueva se aplica
+    nuevas = []
+    vistas = set(previas)
+    for op in operaciones:
+        if op.clave not in vistas:
+            vistas.add(op.clave)
+            nuevas.append(op)
+
+    aplicadas = []
+    if nuevas:
+        lineas = await descontar_lote(session, branch, [(op.producto, op.cantidad) for op in nuevas])
+        fecha = datetime.now(timezone.utc).replace(tzinfo=None)
+        await session.execute(insert(SyncOperation), [
+            {"branch": branch, "clave": op.clave, "ok": ok, "detalle": detalle, "fecha": fecha}
+            for op, (ok, detalle) in zip(nuevas, lineas)
+        ])
+        aplicadas = [(op.producto, op.cantidad) for op, (ok, _) in zip(nuevas, lineas) if ok]
+        await registrar_movimientos(session, [
+            movimiento("venta", producto, branch, -cantidad, usuario) for producto, cantidad in aplicadas
+        ])
+        previas.update({op.clave: linea for op, linea in zip(nuevas, lineas)})
+
+    primeras = {op.clave: op for op in nuevas}
+    resultados = []
+    for op in operaciones:
+        ok, detalle = previas[op.clave]
+        resultados.append((op.clave, ok, detalle, primeras.get(op.clave) is not op))
+    return resultados, aplicadas
+
+#  Cantidades actuales de los productos de la sucursal que cambiaron desde `version`.
+#  Devuelve (version_nueva, completo, [(producto, cantidad o None si se eliminó)]).
+async def cambios_desde(session: AsyncSession, branch: str, version: int) -> Tuple[int, bool, List[tuple]]:
+    # La versión se lee antes que las cantidades: lo que se cuele después se repite la próxima vez
+    ultima = (await session.execute(select(func.max(StockMovement.id)))).scalar() or 0
+
+    if version <= 0 or version > ultima:
+        # Primera sincronización (o versión de otra base): catálogo completo de la sucursal
+        result = await session.execute(
+            select(StockDB.name, StockDB.quantity).where(StockDB.branch == branch).order_by(StockDB.name)
+        )
+        return ultima, True, [(nombre, cantidad or 0) for nombre, cantidad in result.all()]
+
+    # Los ids se asignan al insertar y no al hacer commit: se repasa un margen
+    # hacia atrás para no perder movimientos que confirmaron tarde
+    desde = max(0, version - SYNC_VERSION_OVERLAP)
+    result = await session.execute(
+        select(StockMovement.producto)
+        .where(StockMovement.branch == branch, StockMovement.id > desde)
+        .distinct()
+    )
+    nombres = sorted(result.scalars().all())
+    if not nombres:
+        return ultima, False, []
+    result = await session.execute(
+        select(StockDB.name, StockDB.quantity).where(StockDB.branch == branch, StockDB.name.in_(nombres))
+    )
+    actuales = {nombre: cantidad or 0 for nombre, cantidad in result.all()}
+    return ultima, False, [(nombre, actuales.get(nombre)) for nombre in nombres]
+
+#  Borra claves vencidas (a lo sumo una vez por minuto y por proceso). No hace commit.
+async def purgar_claves(session: AsyncSession) -> None:
+    global _ultima_purga
+    ahora = time.monotonic()
+    if ahora - _ultima_purga < INTERVALO_PURGA_SEGUNDOS:
+        return
+    _ultima_purga = ahora
+    limite = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=SYNC_KEY_TTL_HOURS)
+    stmt = delete(SyncOperation).where(SyncOperation.fecha < limite)
+    if session.bind.dialect.name == "mysql":
+        stmt = stmt.with_dialect_options(mysql_limit=PURGA_MAX_FILAS)
+    await session.execute(stmt.execution_options(synchronize_session=False))
@@ -1,18 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Form, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
-import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+import asyncio
 
 from models import Stock as StockDB, StockRequest as StockRequestDB
-from schemas import Stock
-from database import get_session_stock
+from schemas import (
+    Stock, VentaLote, VentaLoteResultado, VentaLineaResultado,
+    SyncPeticion, SyncRespuesta, SyncResultadoOperacion, SyncProducto,
+)
+from database import get_session_stock, get_session_stock_lectura, fabrica_lectura
 from auth import get_current_user
+from dashboard import filtros_dashboard, cargar_dashboard, datos_solicitud
+from plantillas import respuesta_stream, SUCURSALES
+from versiones import validadores, no_modificado, con_validadores
+from busqueda import filtro_busqueda, indexar_producto, MODOS_BUSQUEDA
+from eventos import publicar, publicar_cambio, suscribir, formato_sse
+from agrupador import agrupador_ventas
+from config import SALES_COALESCE_ENABLED
+from sincronizacion import aplicar_operaciones, cambios_desde, purgar_claves
+from inventario import descontar_stock, cantidad_actual, descontar_lote, ConflictoDeStock, patron_prefijo
+from catalogo import catalogo
+from movimientos import (
+    movimiento, registrar_movimientos, resumen_periodo, listar_movimientos, TIPOS_MOVIMIENTO, AGRUPACIONES
+)
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
+
+# Columnas que se pueden pedir en el parámetro `fields` de GET /stock/
+CAMPOS_STOCK = {
+    "id": StockDB.id,
+    "name": StockDB.name,
+    "quantity": StockDB.quantity,
+    "branch": StockDB.branch,
+    "created_at": StockDB.created_at,
+    "product_id": StockDB.product_id,
+    "branch_id": StockDB.branch_id,
+}
 
 # =============================================
 # 🔸 Rutas para navegador (HTML y formularios)
@@ -22,39 +49,57 @@ templates = Jinja2Templates(directory="templates")
 async def mostrar_stock_html(
     request: Request,
     search: Optional[str] = Query(default=None),
+    modo: Optional[str] = Query(default=None, description="prefijo | contiene | fulltext | trigramas"),
+    filtros: dict = Depends(filtros_dashboard),
     user=Depends(get_current_user),
-    session: AsyncSession = Depends(get_session_stock)
+    session: AsyncSession = Depends(get_session_stock_lectura)
 ):
+    if modo is not None and modo not in MODOS_BUSQUEDA:
+        raise HTTPException(status_code=400, detail=f"Modo de búsqueda no válido: {modo}")
+    if user.role != "admin" and user.branch not in SUCURSALES:
+        raise HTTPException(status_code=500, detail=f"Plantilla no encontrada para la sucursal: {user.branch}")
+
+    # Si nada cambió desde la última visita de este usuario, 304 sin consultar la base
+    etag, ultima_modificacion = await validadores(
+        session,
+        user.branch if user.role != "admin" else None,
+        f"{user.username}|{user.role}|{request.url.query}",
+    )
+    respuesta = no_modificado(request, etag, ultima_modificacion)
+    if respuesta is not None:
+        return respuesta
+
     try:
         search = search.strip() if search else None
         branch = user.branch if user.role != "admin" else None
 
-        if search:
-            stmt = select(StockDB).where(StockDB.name.ilike(f"%{search}%"))
-            if branch:
-                stmt = stmt.where(StockDB.branch == branch)
+        if user.role == "admin":
+            # El admin ve el panel paginado; la búsqueda filtra la tabla de productos
+            filtro = await filtro_busqueda(session, search, modo) if search else None
+            contexto = await cargar_dashboard(fabrica_lectura(request), request, filtros, filtro)
         else:
-            stmt = select(StockDB).where(StockDB.branch == branch) if branch else select(StockDB)
-
-        result = await session.execute(stmt)
-        productos = result.scalars().all()
+            if search:
+                stmt = select(StockDB).where(await filtro_busqueda(session, search, modo, branch))
+                stmt = stmt.where(StockDB.branch == branch)
+            else:
+                stmt = select(StockDB).where(StockDB.branch == branch)
 
-        solicitudes = []
-        if user.role == "admin":
-            result_solicitudes = await session.execute(select(StockRequestDB))
-            solicitudes = result_solicitudes.scalars().all()
+            result = await session.execute(stmt)
+            contexto = {
+                "productos": result.scalars().all(),
+                "solicitudes": [],
+                "sucursal": user.branch,
+                "sucursal_nombre": SUCURSALES[user.branch],
+                "sucursales": SUCURSALES,
+            }
 
-        template_name = f"branch{user.branch}.html" if user.role != "admin" else "administration.html"
-        template_path = f"templates/{template_name}"
-        if not os.path.exists(template_path):
-            raise HTTPException(status_code=500, detail=f"Plantilla no encontrada: {template_name}")
+        template_name = "branch.html" if user.role != "admin" else "administration.html"
 
-        return templates.TemplateResponse(template_name, {
+        return con_validadores(respuesta_stream(template_name, {
             "request": request,
             "username": user.username,
-            "productos": productos,
-            "solicitudes": solicitudes
-        })
+            **contexto
+        }), etag, ultima_modificacion)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
@@ -69,19 +114,27 @@ async def registrar_venta(
     if cantidad <= 0:
         raise HTTPException(status_code=400, detail="La cantidad debe ser mayor a cero")
 
-    result = await session.execute(
-        select(StockDB).where((StockDB.name == producto) & (StockDB.branch == user.branch))
-    )
-    item = result.scalar_one_or_none()
+    if SALES_COALESCE_ENABLED:
+        # La venta se aplica junto con las demás de la sucursal (ya publicada al volver)
+        try:
+            ok, detalle = await agrupador_ventas.registrar(producto, user.branch, cantidad, user.username)
+        except ConflictoDeStock:
+            raise HTTPException(status_code=409, detail="El stock cambió durante la venta, reintenta")
+        if not ok:
+            if detalle == "Producto no encontrado en tu sucursal":
+                raise HTTPException(status_code=404, detail=detalle)
+            raise HTTPException(status_code=400, detail="Stock insuficiente")
+        return RedirectResponse(url="/stock/html", status_code=303)
 
-    if item is None:
-        raise HTTPException(status_code=404, detail="Producto no encontrado en tu sucursal")
-    if item.quantity < cantidad:
+    if not await descontar_stock(session, producto, user.branch, cantidad):
+        await session.rollback()
+        if await cantidad_actual(session, producto, user.branch) is None:
+            raise HTTPException(status_code=404, detail="Producto no encontrado en tu sucursal")
         raise HTTPException(status_code=400, detail="Stock insuficiente")
 
-    item.quantity -= cantidad
-    session.add(item)
+    await registrar_movimientos(session, [movimiento("venta", producto, user.branch, -cantidad, user.username)])
     await session.commit()
+    publicar_cambio("venta", user.branch, producto, -cantidad)
 
     return RedirectResponse(url="/stock/html", status_code=303)
 
@@ -98,21 +151,18 @@ async def solicitar_stock(
     if user.branch == sucursal_destino:
         raise HTTPException(status_code=400, detail="No puedes solicitar productos a tu propia sucursal")
 
-    result = await session.execute(
-        select(StockDB).where((StockDB.name == producto) & (StockDB.branch == sucursal_destino))
-    )
-    producto_destino = result.scalar_one_or_none()
-
-    if producto_destino is None:
-        raise HTTPException(status_code=404, detail=f"El producto '{producto}' no existe en {sucursal_destino}")
-
-    if producto_destino.quantity < cantidad:
-        raise HTTPException(status_code=400, detail=f"No hay suficiente stock en {sucursal_destino}. Solo hay {producto_destino.quantity} unidades.")
-
-    producto_destino.quantity -= cantidad
-    session.add(producto_destino)
+    if not await descontar_stock(session, producto, sucursal_destino, cantidad):
+        await session.rollback()
+        disponible = await cantidad_actual(session, producto, sucursal_destino)
+        if disponible is None:
+            raise HTTPException(status_code=404, detail=f"El producto '{producto}' no existe en {sucursal_destino}")
+        raise HTTPException(status_code=400, detail=f"No hay suficiente stock en {sucursal_destino}. Solo hay {disponible} unidades.")
 
+    productos, sucursales = await catalogo.resolver(session, [producto], [user.branch, sucursal_destino])
     nueva_solicitud = StockRequestDB(
+        producto_id=productos[producto],
+        origen_id=sucursales[user.branch],
+        destino_id=sucursales[sucursal_destino],
         producto=producto,
         cantidad=cantidad,
         sucursal_origen=user.branch,
@@ -120,8 +170,13 @@ async def solicitar_stock(
         usuario=user.username
     )
     session.add(nueva_solicitud)
+    await session.flush()
+    await registrar_movimientos(session, [
+        movimiento("solicitud", producto, sucursal_destino, -cantidad, user.username, nueva_solicitud.id)
+    ])
 
     await session.commit()
+    publicar_cambio("solicitud", sucursal_destino, producto, -cantidad, solicitud=datos_solicitud(nueva_solicitud))
 
     return RedirectResponse(url="/stock/html", status_code=303)
 
@@ -136,16 +191,54 @@ async def crear_producto_admin(
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
 
+    product_id, branch_id = await catalogo.ids(session, name, branch, crear=True)
     nuevo_producto = StockDB(
+        product_id=product_id,
+        branch_id=branch_id,
         name=name,
         quantity=quantity,
         branch=branch
     )
     session.add(nuevo_producto)
-    await session.commit()
+    try:
+        await registrar_movimientos(session, [movimiento("alta", name, branch, quantity, user.username)])
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="El producto ya existe en esa sucursal")
+    indexar_producto(nuevo_producto.id, nuevo_producto.name, nuevo_producto.branch)
+    publicar({"tipo": "creado", "branch": branch, "producto": name, "cantidad": quantity, "id": nuevo_producto.id})
 
     return RedirectResponse(url="/stock/html", status_code=303)
 
+# Segundos entre comentarios de keep-alive del stream de eventos
+INTERVALO_PING_SSE = 15
+
+@router.get("/stock/eventos")
+async def eventos_stock(
+    request: Request,
+    branch: Optional[str] = Query(default=None, description="Solo admin: sucursal a seguir (todas si se omite)"),
+    user=Depends(get_current_user)
+):
+    sucursal = branch if user.role == "admin" else user.branch
+
+    async def generar():
+        async with suscribir(sucursal) as cola:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=INTERVALO_PING_SSE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield formato_sse(evento)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/stock", include_in_schema=False)
 async def redirect_to_stock_html():
     return RedirectResponse(url="/stock/html")
@@ -154,16 +247,220 @@ async def redirect_to_stock_html():
 # 🔹 API REST - Para consumo externo (JSON)
 # =============================================
 
+@router.post("/ventas/lote", response_model=VentaLoteResultado)
+async def registrar_ventas_lote(
+    lote: VentaLote,
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    items = [(item.producto, item.cantidad) for item in lote.items]
+    try:
+        resultados = await descontar_lote(session, user.branch, items)
+    except ConflictoDeStock:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="El stock cambió durante la venta, reintenta el lote")
+    await registrar_movimientos(session, [
+        movimiento("venta", producto, user.branch, -cantidad, user.username)
+        for (producto, cantidad), (ok, _) in zip(items, resultados) if ok
+    ])
+    await session.commit()
+
+    vendidos: dict[str, int] = {}
+    for (producto, cantidad), (ok, _) in zip(items, resultados):
+        if ok:
+            vendidos[producto] = vendidos.get(producto, 0) + cantidad
+    for producto, cantidad in vendidos.items():
+        publicar_cambio("venta", user.branch, producto, -cantidad)
+
+    lineas = [
+        VentaLineaResultado(producto=producto, cantidad=cantidad, ok=ok, detalle=detalle)
+        for (producto, cantidad), (ok, detalle) in zip(items, resultados)
+    ]
+    aplicadas = sum(1 for linea in lineas if linea.ok)
+    return VentaLoteResultado(aplicadas=aplicadas, rechazadas=len(lineas) - aplicadas, lineas=lineas)
+
+@router.post("/sync", response_model=SyncRespuesta)
+async def sincronizar_terminal(
+    peticion: SyncPeticion,
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock)
+):
+    # Un reintento si otra petición registró las mismas claves al mismo tiempo:
+    # la segunda vuelta las encuentra y devuelve el resultado guardado
+    for intento in range(2):
+        try:
+            resultados, aplicadas = await aplicar_operaciones(
+                session, user.branch, user.username, peticion.operaciones
+            )
+            await purgar_claves(session)
+            await session.commit()
+            break
+        except ConflictoDeStock:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="El stock cambió durante la sincronización, reintenta")
+        except IntegrityError:
+            await session.rollback()
+            if intento == 1:
+                raise HTTPException(status_code=409, detail="Operaciones duplicadas en curso, reintenta")
+
+    vendidos: dict[str, int] = {}
+    for producto, cantidad in aplicadas:
+        vendidos[producto] = vendidos.get(producto, 0) + cantidad
+    for producto, cantidad in vendidos.items():
+        publicar_cambio("venta", user.branch, producto, -cantidad)
+
+    version, completo, productos = await cambios_desde(session, user.branch, peticion.version)
+    return SyncRespuesta(
+        version=version,
+        completo=completo,
+        resultados=[
+            SyncResultadoOperacion(clave=clave, ok=ok, detalle=detalle, duplicada=duplicada)
+            for clave, ok, detalle, duplicada in resultados
+        ],
+        productos=[SyncProducto(producto=nombre, quantity=cantidad) for nombre, cantidad in productos],
+    )
+
 @router.get("/stock/{stock_id}", response_model=Stock)
-async def get_stock(stock_id: int, session: AsyncSession = Depends(get_session_stock)):
+async def get_stock(
+    stock_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_session_stock_lectura)
+):
+    # Sin consultar la base no se sabe la sucursal del producto: se usa la versión global
+    etag, ultima_modificacion = await validadores(session, None, f"stock/{stock_id}")
+    respuesta = no_modificado(request, etag, ultima_modificacion)
+    if respuesta is not None:
+        return respuesta
+
     result = await session.execute(select(StockDB).filter(StockDB.id == stock_id))
     stock_db = result.scalar_one_or_none()
     if stock_db is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    con_validadores(response, etag, ultima_modificacion)
     return Stock.from_orm(stock_db)
 
-@router.get("/stock/", response_model=List[Stock])
-async def get_all_stocks(session: AsyncSession = Depends(get_session_stock)):
-    result = await session.execute(select(StockDB))
-    stocks_db = result.scalars().all()
-    return [Stock.from_orm(stock_db) for stock_db in stocks_db]
+@router.get("/stock/")
+async def get_all_stocks(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=1000),
+    after_id: Optional[int] = Query(default=None, description="Cursor: id del último producto recibido"),
+    branch: Optional[str] = Query(default=None),
+    name: Optional[str] = Query(default=None, description="Prefijo del nombre del producto"),
+    fields: Optional[str] = Query(default=None, description="Campos separados por coma, p. ej. id,name,quantity"),
+    session: AsyncSession = Depends(get_session_stock_lectura)
+):
+    etag, ultima_modificacion = await validadores(session, branch or None, f"stock/?{request.url.query}")
+    respuesta = no_modificado(request, etag, ultima_modificacion)
+    if respuesta is not None:
+        return respuesta
+
+    campos = list(CAMPOS_STOCK)
+    if fields:
+        pedidos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        invalidos = [campo for campo in pedidos if campo not in CAMPOS_STOCK]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(invalidos)}")
+        # El id siempre se incluye porque es el cursor de paginación
+        campos = ["id"] + [campo for campo in pedidos if campo != "id"]
+
+    stmt = select(*(CAMPOS_STOCK[campo] for campo in campos)).order_by(StockDB.id).limit(limit + 1)
+    if after_id is not None:
+        stmt = stmt.where(StockDB.id > after_id)
+    if branch:
+        stmt = stmt.where(StockDB.branch == branch)
+    if name:
+        stmt = stmt.where(StockDB.name.like(patron_prefijo(name.strip()), escape="\\"))
+
+    # Se serializan las tuplas directamente, sin hidratar objetos ORM ni Pydantic
+    filas = (await session.execute(stmt)).all()
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+    con_fecha = "created_at" in campos
+    items = []
+    for fila in filas:
+        item = dict(zip(campos, fila))
+        if con_fecha and item["created_at"] is not None:
+            item["created_at"] = item["created_at"].isoformat()
+        items.append(item)
+
+    headers = {}
+    if hay_mas:
+        siguiente = filas[-1][0]
+        headers["X-Next-Cursor"] = str(siguiente)
+        headers["Link"] = f'<{request.url.include_query_params(after_id=siguiente)}>; rel="next"'
+    return con_validadores(JSONResponse(items, headers=headers), etag, ultima_modificacion)
+
+# =============================================
+# 🔹 Movimientos de stock (libro y reportes por periodo)
+# =============================================
+
+def _periodo(desde: Optional[date], hasta: Optional[date]) -> tuple:
+    # Por defecto, los últimos 7 días (UTC)
+    hasta = hasta or datetime.now(timezone.utc).date()
+    desde = desde or hasta - timedelta(days=6)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="'desde' no puede ser posterior a 'hasta'")
+    return desde, hasta
+
+def _validar_tipo(tipo: Optional[str]) -> None:
+    if tipo and tipo not in TIPOS_MOVIMIENTO:
+        raise HTTPException(status_code=400, detail=f"Tipo no válido. Opciones: {', '.join(TIPOS_MOVIMIENTO)}")
+
+@router.get("/movimientos/resumen")
+async def resumen_movimientos(
+    desde: Optional[date] = Query(default=None),
+    hasta: Optional[date] = Query(default=None),
+    agrupar: str = Query(default="dia,producto", description="Campos separados por coma: dia, branch, producto, tipo"),
+    branch: Optional[str] = Query(default=None, description="Solo admin: los demás ven su sucursal"),
+    producto: Optional[str] = Query(default=None),
+    tipo: Optional[str] = Query(default="venta"),
+    limite: int = Query(default=1000, ge=1, le=10000),
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock_lectura)
+):
+    desde, hasta = _periodo(desde, hasta)
+    _validar_tipo(tipo)
+    campos = list(dict.fromkeys(campo.strip() for campo in agrupar.split(",") if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in AGRUPACIONES]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"No se puede agrupar por: {', '.join(invalidos)}")
+
+    sucursal = branch if user.role == "admin" else user.branch
+    filas = await resumen_periodo(session, desde, hasta, campos, sucursal, producto, tipo, limite)
+    return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "filas": filas}
+
+@router.get("/movimientos")
+async def listar_movimientos_stock(
+    request: Request,
+    desde: Optional[date] = Query(default=None),
+    hasta: Optional[date] = Query(default=None),
+    branch: Optional[str] = Query(default=None, description="Solo admin: los demás ven su sucursal"),
+    producto: Optional[str] = Query(default=None),
+    tipo: Optional[str] = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+    after_id: Optional[int] = Query(default=None, description="Cursor: id del último movimiento recibido"),
+    user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_session_stock_lectura)
+):
+    desde, hasta = _periodo(desde, hasta)
+    _validar_tipo(tipo)
+    sucursal = branch if user.role == "admin" else user.branch
+
+    filas = await listar_movimientos(session, desde, hasta, limit + 1, after_id, sucursal, producto, tipo)
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+    items = [
+        {
+            "id": m.id, "fecha": m.fecha.isoformat(), "tipo": m.tipo, "producto": m.producto,
+            "branch": m.branch, "delta": m.delta, "usuario": m.usuario, "referencia": m.referencia,
+        }
+        for m in filas
+    ]
+
+    headers = {}
+    if hay_mas:
+        siguiente = filas[-1].id
+        headers["X-Next-Cursor"] = str(siguiente)
+        headers["Link"] = f'<{request.url.include_query_params(after_id=siguiente)}>; rel="next"'
+    return JSONResponse(items, headers=headers)
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Antes de importar los módulos de la app: config y database leen el entorno al importarse
+_base = tempfile.mkdtemp(prefix="capirulo-tests-")
+os.environ.update(
+    SECRET_KEY="test",
+    DATABASE_URL_SQL=f"sqlite+aiosqlite:///{_base}/users.db",
+    DATABASE_URL_SQL_STOCK=f"sqlite+aiosqlite:///{_base}/stock.db",
+    BCRYPT_ROUNDS="4",
+)
+sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(scope="session")
+def clientes():
+    os.chdir(RAIZ)  # Las plantillas se cargan con ruta relativa
+    from fastapi.testclient import TestClient
+    import auth
+    import database
+    import main
+
+    async def sembrar():
+        await database.init_db()
+        async with database.SessionLocal() as session:
+            await auth.create_user(session, "admin", "a@test.com", "secret1", role="admin", branch="soacha")
+            await auth.create_user(session, "cajero", "c@test.com", "secret1", role="user", branch="soacha")
+
+    asyncio.run(sembrar())
+    with TestClient(main.app, base_url="https://testserver") as admin, \
+            TestClient(main.app, base_url="https://testserver") as cajero:
+        for cliente, usuario in ((admin, "admin"), (cajero, "cajero")):
+            r = cliente.post("/token", data={"username": usuario, "password": "secret1"}, follow_redirects=False)
+            assert r.status_code == 303
+        yield admin, cajero
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+
+import admision
+from admision import AdmisionMiddleware, Limite
+
+
+def test_limite_pasa_el_cupo_en_orden_de_llegada():
+    async def escenario():
+        limite = Limite(capacidad=1, cola=2)
+        assert await limite.entrar(1)
+        orden = []
+
+        async def esperar(nombre):
+            assert await limite.entrar(1)
+            orden.append(nombre)
+
+        primera = asyncio.create_task(esperar("primera"))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(esperar("segunda"))
+        await asyncio.sleep(0)
+        assert limite.estado()["en_cola"] == 2
+
+        # Cola llena: se rechaza sin esperar
+        assert not await limite.entrar(1)
+        assert limite.rechazadas == 1
+
+        limite.salir()
+        await primera
+        limite.salir()
+        await segunda
+        assert orden == ["primera", "segunda"]
+        # El cupo pasó de mano en mano: sigue habiendo uno solo ocupado
+        assert limite.activos == 1
+        limite.salir()
+        assert limite.estado() == {"capacidad": 1, "activos": 0, "en_cola": 0, "rechazadas": 1}
+
+    asyncio.run(escenario())
+
+
+def test_limite_rechaza_al_vencer_la_espera():
+    async def escenario():
+        limite = Limite(capacidad=1, cola=1)
+        assert await limite.entrar(1)
+        assert not await limite.entrar(0.01)
+        assert limite.estado()["en_cola"] == 0
+        limite.salir()
+        assert limite.activos == 0
+
+    asyncio.run(escenario())
+
+
+#  Aplicación mínima que retiene el cupo hasta que se libera `soltar`
+def _app_retenida(soltar: asyncio.Event):
+    async def app(scope, receive, send):
+        await soltar.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return AdmisionMiddleware(app)
+
+
+def _rechazo_con_otra_peticion(monkeypatch, cookies: dict) -> httpx.Response:
+    monkeypatch.setattr(admision, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.01)
+    monkeypatch.setattr(admision, "claims_de_cookie",
+                        lambda valor: {"branch": "soacha", "role": "user"} if valor else None)
+
+    async def escenario():
+        soltar = asyncio.Event()
+        transporte = httpx.ASGITransport(app=_app_retenida(soltar))
+        async with httpx.AsyncClient(transport=transporte, base_url="http://t", cookies=cookies) as cliente:
+            primera = asyncio.create_task(cliente.get("/stock/"))
+            await asyncio.sleep(0.01)
+            rechazada = await cliente.get("/stock/")
+            soltar.set()
+            assert (await primera).status_code == 200
+            return rechazada
+
+    return asyncio.run(escenario())
+
+
+def test_503_si_se_llena_la_clase(monkeypatch):
+    monkeypatch.setitem(admision.limites_clase, "lecturas", Limite(1, 0))
+    r = _rechazo_con_otra_peticion(monkeypatch, {})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"]
+
+
+def test_429_si_se_llena_la_sucursal(monkeypatch):
+    monkeypatch.setitem(admision.limites_clase, "lecturas", Limite(10, 0))
+    monkeypatch.setitem(admision.limites_sucursal, "soacha", Limite(1, 0))
+    r = _rechazo_con_otra_peticion(monkeypatch, {"Authorization": "token"})
+    assert r.status_code == 429
+    assert admision.limites_sucursal["soacha"].activos == 0
+
+
+def test_rutas_exentas_y_clases():
+    assert admision.clase_de_ruta("GET", "/stock/eventos") is None
+    assert admision.clase_de_ruta("POST", "/token") == "login"
+    assert admision.clase_de_ruta("GET", "/admin/") == "admin"
+    assert admision.clase_de_ruta("POST", "/registrar-venta") == "escrituras"
+    assert admision.clase_de_ruta("GET", "/stock/") == "lecturas"
@@ -0,0 +1,109 @@
+import asyncio
+
+import agrupador
+from agrupador import AgrupadorVentas, REINTENTOS_CONFLICTO
+from inventario import ConflictoDeStock
+
+
+class _Sesion:
+    def __init__(self):
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+
+#  descontar_lote falso: falla con ConflictoDeStock las primeras `conflictos` veces
+def _preparar(monkeypatch, conflictos: int):
+    llamadas = []
+    movimientos = []
+    publicados = []
+
+    async def descontar_lote(session, branch, items):
+        llamadas.append(list(items))
+        if len(llamadas) <= conflictos:
+            raise ConflictoDeStock()
+        return [(cantidad <= 5, None if cantidad <= 5 else "Stock insuficiente") for _, cantidad in items]
+
+    async def registrar_movimientos(session, filas):
+        movimientos.extend(filas)
+
+    monkeypatch.setattr(agrupador, "descontar_lote", descontar_lote)
+    monkeypatch.setattr(agrupador, "registrar_movimientos", registrar_movimientos)
+    monkeypatch.setattr(agrupador, "publicar_cambio", lambda *args: publicados.append(args))
+    return llamadas, movimientos, publicados
+
+
+async def _vender(agrupado: AgrupadorVentas, ventas: list):
+    return await asyncio.gather(
+        *(agrupado.registrar(producto, "soacha", cantidad, "cajero") for producto, cantidad in ventas),
+        return_exceptions=True,
+    )
+
+
+def test_ventas_de_la_ventana_van_en_un_lote(monkeypatch):
+    llamadas, movimientos, publicados = _preparar(monkeypatch, conflictos=0)
+    sesiones = []
+    agrupado = AgrupadorVentas(lambda: sesiones.append(_Sesion()) or sesiones[-1], ventana_ms=5, max_lote=10)
+
+    resultados = asyncio.run(_vender(agrupado, [("arroz", 1), ("arroz", 9), ("sal", 2), ("arroz", 3)]))
+
+    assert resultados == [(True, None), (False, "Stock insuficiente"), (True, None), (True, None)]
+    assert llamadas == [[("arroz", 1), ("arroz", 9), ("sal", 2), ("arroz", 3)]]
+    assert [s.commits for s in sesiones] == [1]
+    assert [(m["producto"], m["delta"]) for m in movimientos] == [("arroz", -1), ("sal", -2), ("arroz", -3)]
+    assert sorted(publicados) == [("venta", "soacha", "arroz", -4), ("venta", "soacha", "sal", -2)]
+    assert (agrupado.lotes, agrupado.ventas) == (1, 4)
+
+
+def test_max_lote_parte_la_ventana(monkeypatch):
+    llamadas, _, _ = _preparar(monkeypatch, conflictos=0)
+    agrupado = AgrupadorVentas(_Sesion, ventana_ms=5, max_lote=2)
+    asyncio.run(_vender(agrupado, [("arroz", 1)] * 5))
+    assert [len(lote) for lote in llamadas] == [2, 2, 1]
+
+
+def test_conflicto_se_reintenta(monkeypatch):
+    llamadas, movimientos, _ = _preparar(monkeypatch, conflictos=REINTENTOS_CONFLICTO - 1)
+    agrupado = AgrupadorVentas(_Sesion, ventana_ms=1, max_lote=10)
+
+    resultados = asyncio.run(_vender(agrupado, [("arroz", 1), ("sal", 1)]))
+
+    assert resultados == [(True, None), (True, None)]
+    assert len(llamadas) == REINTENTOS_CONFLICTO
+    # Los intentos fallidos no dejan movimientos
+    assert len(movimientos) == 2
+
+
+def test_conflicto_persistente_falla_todo_el_lote(monkeypatch):
+    llamadas, movimientos, publicados = _preparar(monkeypatch, conflictos=REINTENTOS_CONFLICTO)
+    agrupado = AgrupadorVentas(_Sesion, ventana_ms=1, max_lote=10)
+
+    resultados = asyncio.run(_vender(agrupado, [("arroz", 1), ("sal", 1)]))
+
+    assert all(isinstance(r, ConflictoDeStock) for r in resultados)
+    assert len(llamadas) == REINTENTOS_CONFLICTO
+    assert movimientos == [] and publicados == []
+    assert agrupado.lotes == 0
+
+
+def test_venta_agrupada_contra_la_base(clientes, monkeypatch):
+    # Ruta completa con SALES_COALESCE_ENABLED activo
+    import stock_routes
+
+    admin, cajero = clientes
+    monkeypatch.setattr(stock_routes, "SALES_COALESCE_ENABLED", True)
+    admin.post("/admin/productos/crear", data={"name": "melaza agrupada", "quantity": 3, "branch": "soacha"})
+    r = cajero.post("/registrar-venta", data={"producto": "melaza agrupada", "cantidad": 2}, follow_redirects=False)
+    assert r.status_code == 303
+    r = cajero.post("/registrar-venta", data={"producto": "melaza agrupada", "cantidad": 2}, follow_redirects=False)
+    assert r.status_code == 400
+    r = cajero.post("/registrar-venta", data={"producto": "no-existe", "cantidad": 1}, follow_redirects=False)
+    assert r.status_code == 404
+    assert cajero.get("/stock/", params={"branch": "soacha", "name": "melaza agrupada"}).json()[0]["quantity"] == 1
@@ -0,0 +1,60 @@
+import asyncio
+import os
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+
+async def _ids_solicitudes(producto: str) -> list:
+    from models import StockRequest
+
+    engine = create_async_engine(os.environ["DATABASE_URL_SQL_STOCK"])
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(StockRequest.id).where(StockRequest.producto == producto).order_by(StockRequest.id)
+        )
+        ids = result.scalars().all()
+    await engine.dispose()
+    return ids
+
+
+def _cantidad(cliente, producto: str, branch: str) -> int:
+    return cliente.get("/stock/", params={"branch": branch, "name": producto}).json()[0]["quantity"]
+
+
+#  El cajero de soacha reserva en suba; al aprobar se descuenta de soacha (origen) y se suma en suba
+def test_aprobacion_por_lote_parcial(clientes):
+    admin, cajero = clientes
+    for branch, cantidad in (("suba", 10), ("soacha", 1)):
+        r = admin.post("/admin/productos/crear", data={"name": "tornillos", "quantity": cantidad, "branch": branch},
+                       follow_redirects=False)
+        assert r.status_code == 303
+    for cantidad in (3, 1):
+        r = cajero.post("/solicitar-stock", data={"producto": "tornillos", "cantidad": cantidad, "sucursal_destino": "suba"},
+                        follow_redirects=False)
+        assert r.status_code == 303
+    grande, chica = asyncio.run(_ids_solicitudes("tornillos"))
+
+    r = admin.post("/admin/solicitudes/aprobar-lote", json={"ids": [grande, chica, 999999]})
+    assert r.status_code == 200
+    reporte = r.json()
+    assert reporte["aprobadas"] == 1 and reporte["rechazadas"] == 2
+    assert reporte["resultados"] == [
+        {"id": grande, "ok": False, "detalle": "Stock insuficiente en sucursal origen"},
+        {"id": chica, "ok": True, "detalle": None},
+        {"id": 999999, "ok": False, "detalle": "Solicitud no encontrada"},
+    ]
+    assert _cantidad(admin, "tornillos", "soacha") == 0
+    assert _cantidad(admin, "tornillos", "suba") == 10 - 3 - 1 + 1
+
+    # La aprobada ya no se vuelve a procesar; la rechazada sigue pendiente
+    r = admin.post("/admin/solicitudes/aprobar-lote", json={"ids": [chica, grande]})
+    detalles = {fila["id"]: fila["detalle"] for fila in r.json()["resultados"]}
+    assert detalles[chica] == "Solicitud no válida o ya procesada"
+    assert detalles[grande] == "Stock insuficiente en sucursal origen"
+
+
+def test_aprobacion_por_lote_requiere_filtro(clientes):
+    admin, cajero = clientes
+    assert admin.post("/admin/solicitudes/aprobar-lote", json={}).status_code == 400
+    assert cajero.post("/admin/solicitudes/aprobar-lote", json={"ids": [1]}).status_code == 403
@@ -0,0 +1,35 @@
+#  Por defecto la búsqueda es por subcadena, como antes de los modos indexados
+def test_busqueda_por_subcadena_por_defecto(clientes):
+    admin, cajero = clientes
+    r = admin.post("/admin/productos/crear", data={"name": "azucar morena", "quantity": 4, "branch": "soacha"},
+                   follow_redirects=False)
+    assert r.status_code == 303
+    r = cajero.get("/stock/html", params={"search": "zucar"})
+    assert r.status_code == 200
+    assert "azucar morena" in r.text
+
+
+def test_busqueda_por_prefijo_a_pedido(clientes):
+    admin, cajero = clientes
+    admin.post("/admin/productos/crear", data={"name": "sal marina", "quantity": 4, "branch": "soacha"})
+    r = cajero.get("/stock/html", params={"search": "marina", "modo": "prefijo"})
+    assert "sal marina" not in r.text
+    r = cajero.get("/stock/html", params={"search": "sal m", "modo": "prefijo"})
+    assert "sal marina" in r.text
+
+
+def test_consulta_fulltext_quita_operadores_booleanos():
+    from busqueda import consulta_fulltext
+
+    assert consulta_fulltext("arr bla") == "+arr* +bla*"
+    assert consulta_fulltext('+arroz -"blanco" (paca)~ <x> @3 **') == "+arroz* +blanco* +paca* +x* +3*"
+    assert consulta_fulltext('"()<>~@+-*') == ""
+
+
+#  Fuera de MySQL el modo fulltext busca por prefijo; con operadores no debe fallar
+def test_busqueda_fulltext_con_operadores(clientes):
+    admin, cajero = clientes
+    admin.post("/admin/productos/crear", data={"name": "fideos", "quantity": 4, "branch": "soacha"})
+    for texto in ('fid"eo', "+(fid", "@@", '"()<>~'):
+        r = cajero.get("/stock/html", params={"search": texto, "modo": "fulltext"})
+        assert r.status_code == 200, texto
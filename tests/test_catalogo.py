@@ -0,0 +1,45 @@
+import asyncio
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from catalogo import Catalogo
+
+
+#  La sesión del llamador no ve las filas nuevas (instantánea de REPEATABLE READ en MySQL)
+async def _resolver_con_instantanea_vieja(productos, sucursales):
+    catalogo = Catalogo()
+    buscar = catalogo._buscar
+
+    async def buscar_sin_filas_nuevas(ejecutor, modelo, columna, cache, nombres):
+        if isinstance(ejecutor, AsyncSession):
+            return
+        await buscar(ejecutor, modelo, columna, cache, nombres)
+
+    catalogo._buscar = buscar_sin_filas_nuevas
+    engine = create_async_engine(os.environ["DATABASE_URL_SQL_STOCK"])
+    try:
+        Session = sessionmaker(bind=engine, class_=AsyncSession)
+        async with Session() as session:
+            return await catalogo.resolver(session, productos, sucursales, crear=True)
+    finally:
+        await engine.dispose()
+
+
+def test_crear_devuelve_ids_aunque_la_sesion_no_los_vea(clientes):
+    productos, sucursales = asyncio.run(_resolver_con_instantanea_vieja(["catalogo-nuevo"], ["sucursal-nueva"]))
+    assert productos["catalogo-nuevo"] is not None
+    assert sucursales["sucursal-nueva"] is not None
+
+
+def test_producto_creado_se_puede_vender(clientes):
+    admin, cajero = clientes
+    r = admin.post("/admin/productos/crear", data={"name": "lentejas", "quantity": 6, "branch": "soacha"},
+                   follow_redirects=False)
+    assert r.status_code == 303
+    r = cajero.post("/registrar-venta", data={"producto": "lentejas", "cantidad": 2}, follow_redirects=False)
+    assert r.status_code == 303
+    item = cajero.get("/stock/?branch=soacha&name=lentejas&fields=quantity,product_id,branch_id").json()[0]
+    assert item["quantity"] == 4
+    assert item["product_id"] is not None and item["branch_id"] is not None
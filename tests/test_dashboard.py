@@ -0,0 +1,62 @@
+#  El botón "Filtrar" envía los campos de fecha vacíos como desde=&hasta=
+def test_filtro_con_fechas_vacias(clientes):
+    admin, cajero = clientes
+    r = admin.get("/admin/?sucursal=&estado=&desde=&hasta=")
+    assert r.status_code == 200
+    r = cajero.get("/stock/html?sucursal=&estado=&desde=&hasta=")
+    assert r.status_code == 200
+
+
+def test_filtro_con_fechas(clientes):
+    admin, _ = clientes
+    r = admin.get("/admin/?sucursal=soacha&estado=pendiente&desde=2024-01-01&hasta=2024-12-31")
+    assert r.status_code == 200
+    assert 'value="2024-01-01"' in r.text
+
+
+def test_filtro_con_fecha_invalida(clientes):
+    admin, _ = clientes
+    r = admin.get("/admin/?desde=ayer")
+    assert r.status_code == 400
+
+
+def test_panel_usa_sucursales_configuradas(clientes):
+    from plantillas import SUCURSALES
+
+    admin, _ = clientes
+    r = admin.get("/admin/?sucursal=suba")
+    assert r.status_code == 200
+    for valor, nombre in SUCURSALES.items():
+        assert f'<option value="{valor}">{nombre}</option>' in r.text
+    assert '<option value="suba" selected>Suba</option>' in r.text
+    for contador in ("resumen-productos", "resumen-unidades", "resumen-solicitudes", "estado-pendiente"):
+        assert f'id="{contador}"' in r.text
+
+
+#  El panel se actualiza con los eventos: las solicitudes y eliminaciones traen lo necesario
+def test_eventos_traen_datos_para_el_panel(clientes, monkeypatch):
+    import asyncio
+
+    import eventos
+    from test_aprobaciones import _ids_solicitudes
+
+    admin, cajero = clientes
+    publicados = []
+    monkeypatch.setattr(eventos, "_oyentes", eventos._oyentes + [publicados.append])
+    for branch in ("suba", "soacha"):
+        admin.post("/admin/productos/crear", data={"name": "clavos", "quantity": 4, "branch": branch})
+
+    cajero.post("/solicitar-stock", data={"producto": "clavos", "cantidad": 2, "sucursal_destino": "suba"})
+    solicitud = next(e for e in publicados if e["tipo"] == "solicitud")["solicitud"]
+    assert (solicitud["cantidad"], solicitud["origen"], solicitud["destino"]) == (2, "soacha", "suba")
+    assert solicitud["estado"] == "pendiente" and solicitud["usuario"] == "cajero"
+
+    [id_solicitud] = asyncio.run(_ids_solicitudes("clavos"))
+    admin.post("/admin/solicitudes/aprobar", data={"id": id_solicitud})
+    aprobadas = [e["solicitud"] for e in publicados if e["tipo"] == "transferencia" and "solicitud" in e]
+    assert [(s["id"], s["estado"]) for s in aprobadas] == [(id_solicitud, "aprobado")]
+
+    creado = next(e for e in publicados if e["tipo"] == "creado" and e["branch"] == "soacha")
+    admin.post("/admin/productos/eliminar", data={"id": creado["id"]})
+    eliminado = next(e for e in publicados if e["tipo"] == "eliminado")
+    assert (eliminado["id"], eliminado["cantidad"]) == (creado["id"], 2)
@@ -0,0 +1,20 @@
+import main_uvicorn
+
+
+def test_un_worker_por_defecto(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert main_uvicorn.configuracion()["workers"] == 1
+    assert main_uvicorn.advertencias(1) == []
+
+
+def test_workers_auto_usa_las_cpus(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "auto")
+    monkeypatch.setattr(main_uvicorn, "cpus_disponibles", lambda: 4)
+    assert main_uvicorn.configuracion()["workers"] == 4
+
+
+def test_avisa_el_estado_por_worker(monkeypatch):
+    monkeypatch.setenv("SEARCH_MODE", "trigramas")
+    avisos = main_uvicorn.advertencias(3)
+    assert any("SSE" in aviso for aviso in avisos)
+    assert any("trigramas" in aviso for aviso in avisos)
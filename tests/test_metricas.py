@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import metricas
+from metricas import instrumentar_engine, registro
+
+
+#  Una sentencia que falla no deja su inicio colgado en la conexión
+def test_consulta_fallida_no_deja_restos():
+    async def escenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        instrumentar_engine(engine, "prueba_errores")
+        contadores = [0, 0.0]
+        token = metricas._peticion_actual.set(contadores)
+        try:
+            async with engine.connect() as conn:
+                for _ in range(3):
+                    with pytest.raises(OperationalError):
+                        await conn.execute(text("SELECT * FROM no_existe"))
+                await conn.execute(text("SELECT 1"))
+                info = (await conn.get_raw_connection()).info
+        finally:
+            metricas._peticion_actual.reset(token)
+            await engine.dispose()
+        return contadores, info
+
+    contadores, info = asyncio.run(escenario())
+    assert not info.get("metricas_inicio")
+    assert contadores[0] == 1
+    assert registro.consultas_engine["prueba_errores"] == 1
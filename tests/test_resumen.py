@@ -0,0 +1,36 @@
+from resumen import ResumenInventario
+
+
+def _cargado(cantidades: dict) -> ResumenInventario:
+    resumen = ResumenInventario()
+    for (producto, branch), cantidad in cantidades.items():
+        resumen._fijar(producto, branch, cantidad)
+    resumen.cargado = 1.0
+    return resumen
+
+
+def test_alertas_devuelve_las_de_menor_stock():
+    resumen = _cargado({(f"p{i:03d}", "soacha"): i % 6 for i in range(300)})
+    alertas = resumen.alertas(limite=10)
+    assert len(alertas) == 10
+    assert all(a["quantity"] == 0 for a in alertas)
+    assert [a["producto"] for a in alertas] == sorted(a["producto"] for a in alertas)
+
+
+def test_alertas_filtra_por_sucursal():
+    resumen = _cargado({("arroz", "soacha"): 1, ("arroz", "suba"): 0, ("sal", "suba"): 3})
+    assert [a["producto"] for a in resumen.alertas("suba")] == ["arroz", "sal"]
+
+
+def test_evento_durante_la_primera_carga_marca_desactualizado():
+    resumen = ResumenInventario()
+    resumen.cargando = True
+    resumen.aplicar({"tipo": "venta", "producto": "arroz", "branch": "soacha", "delta": -1})
+    assert resumen.desactualizado
+
+
+def test_evento_antes_de_cargar_se_ignora():
+    resumen = ResumenInventario()
+    resumen.aplicar({"tipo": "venta", "producto": "arroz", "branch": "soacha", "delta": -1})
+    assert not resumen.desactualizado
+    assert not resumen.cantidades
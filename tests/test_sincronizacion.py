@@ -0,0 +1,87 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+
+def _sync(cliente, version=0, operaciones=()):
+    r = cliente.post("/sync", json={"version": version, "operaciones": list(operaciones)})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_sync_incluye_producto_importado_sin_stock(clientes):
+    admin, cajero = clientes
+    admin.post("/admin/productos/crear", data={"name": "sync-base", "quantity": 3, "branch": "soacha"})
+    version = _sync(cajero)["version"]
+    assert version > 0
+
+    r = admin.post("/admin/productos/importar",
+                   files={"archivo": ("stock.csv", b"name,quantity,branch\nsync-importado,0,soacha\n")})
+    assert r.json()["procesadas"] == 1
+
+    respuesta = _sync(cajero, version)
+    assert not respuesta["completo"]
+    assert {"producto": "sync-importado", "quantity": 0} in respuesta["productos"]
+
+
+def _cantidad(cliente, producto: str) -> int:
+    return cliente.get("/stock/", params={"branch": "soacha", "name": producto}).json()[0]["quantity"]
+
+
+def test_sync_reenvio_no_vuelve_a_descontar(clientes):
+    admin, cajero = clientes
+    admin.post("/admin/productos/crear", data={"name": "sync-idempotente", "quantity": 5, "branch": "soacha"})
+    operaciones = [
+        {"clave": "terminal-a-0001", "producto": "sync-idempotente", "cantidad": 2},
+        {"clave": "terminal-a-0002", "producto": "sync-idempotente", "cantidad": 9},
+        {"clave": "terminal-a-0001", "producto": "sync-idempotente", "cantidad": 2},
+    ]
+
+    primera = _sync(cajero, operaciones=operaciones)["resultados"]
+    assert [(r["ok"], r["duplicada"]) for r in primera] == [(True, False), (False, False), (True, True)]
+    assert primera[1]["detalle"] == "Stock insuficiente. Solo hay 3 unidades."
+    assert _cantidad(cajero, "sync-idempotente") == 3
+
+    # Reenvío completo (la terminal no recibió la respuesta): mismos resultados, sin descontar
+    segunda = _sync(cajero, operaciones=operaciones)["resultados"]
+    assert [(r["ok"], r["detalle"]) for r in segunda] == [(r["ok"], r["detalle"]) for r in primera]
+    assert all(r["duplicada"] for r in segunda)
+    assert _cantidad(cajero, "sync-idempotente") == 3
+
+
+async def _claves(*nuevas) -> set:
+    from models import SyncOperation
+
+    engine = create_async_engine(os.environ["DATABASE_URL_SQL_STOCK"])
+    async with engine.begin() as conn:
+        ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+        for clave, horas in nuevas:
+            await conn.execute(insert(SyncOperation).values(
+                branch="soacha", clave=clave, ok=True, fecha=ahora - timedelta(hours=horas)
+            ))
+        claves = set((await conn.execute(select(SyncOperation.clave))).scalars().all())
+    await engine.dispose()
+    return claves
+
+
+def test_sync_purga_claves_vencidas(clientes, monkeypatch):
+    import sincronizacion
+    from config import SYNC_KEY_TTL_HOURS
+
+    _, cajero = clientes
+    asyncio.run(_claves(("purga-vieja-01", SYNC_KEY_TTL_HOURS + 1), ("purga-reciente", 1)))
+
+    monkeypatch.setattr(sincronizacion, "_ultima_purga", 0.0)
+    _sync(cajero)
+    claves = asyncio.run(_claves())
+    assert "purga-vieja-01" not in claves
+    assert "purga-reciente" in claves
+
+    # A lo sumo una purga por intervalo y por proceso
+    asyncio.run(_claves(("purga-vieja-02", SYNC_KEY_TTL_HOURS + 1)))
+    _sync(cajero)
+    assert "purga-vieja-02" in asyncio.run(_claves())
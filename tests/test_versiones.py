@@ -0,0 +1,66 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+
+#  Venta hecha por otro worker: escribe en la base sin pasar por el bus de eventos de este proceso
+async def _venta_en_otro_worker(producto: str, branch: str, cantidad: int):
+    from models import Stock, StockMovement
+
+    engine = create_async_engine(os.environ["DATABASE_URL_SQL_STOCK"])
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(Stock).where(Stock.name == producto, Stock.branch == branch)
+            .values(quantity=Stock.quantity - cantidad)
+        )
+        await conn.execute(insert(StockMovement).values(
+            fecha=datetime.now(timezone.utc).replace(tzinfo=None), tipo="venta",
+            producto=producto, branch=branch, delta=-cantidad,
+        ))
+    await engine.dispose()
+
+
+def test_etag_cambia_con_escrituras_de_otro_worker(clientes):
+    admin, cajero = clientes
+    r = admin.post("/admin/productos/crear", data={"name": "panela", "quantity": 10, "branch": "soacha"},
+                   follow_redirects=False)
+    assert r.status_code == 303
+
+    r = cajero.get("/stock/?branch=soacha&name=panela")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    r = cajero.get("/stock/?branch=soacha&name=panela", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    asyncio.run(_venta_en_otro_worker("panela", "soacha", 3))
+
+    r = cajero.get("/stock/?branch=soacha&name=panela", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()[0]["quantity"] == 7
+
+
+def test_etag_cambia_despues_de_vender(clientes):
+    admin, cajero = clientes
+    admin.post("/admin/productos/crear", data={"name": "cafe", "quantity": 5, "branch": "soacha"})
+    r = cajero.get("/stock/html")
+    etag = r.headers["etag"]
+    r = cajero.post("/registrar-venta", data={"producto": "cafe", "cantidad": 1}, follow_redirects=False)
+    assert r.status_code == 303
+    r = cajero.get("/stock/html", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+
+#  Un producto nuevo importado con cantidad 0 también cambia la versión
+def test_etag_cambia_al_importar_producto_nuevo_sin_stock(clientes):
+    admin, _ = clientes
+    r = admin.get("/stock/html")
+    etag = r.headers["etag"]
+    r = admin.post("/admin/productos/importar",
+                   files={"archivo": ("stock.csv", b"name,quantity,branch\nimportado-cero,0,soacha\n")})
+    assert r.json()["procesadas"] == 1
+    r = admin.get("/stock/html", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert "importado-cero" in r.text
@@ -0,0 +1,83 @@
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import timezone
+from typing import Optional
+import hashlib
+import time
+
+from models import StockMovement
+from config import ETAG_VALIDITY_SECONDS
+
+# =============================================
+# 🔸 Versiones de inventario por sucursal para ETags / 304
+# =============================================
+#
+# Todo cambio de stock deja una fila en el libro de movimientos en la misma
+# transacción, así que el último id del libro (global o de una sucursal) es
+# una versión compartida por todos los workers e instancias. Se lee con una
+# consulta por índice en la misma sesión que serviría la respuesta: si el
+# cliente ya tiene esa versión, 304 sin cargar nada más.
+#
+# Los ids se asignan al insertar y no al hacer commit, así que un movimiento
+# ajeno que confirme tarde podría no cambiar la versión. El ETag incluye una
+# ventana de ETAG_VALIDITY_SECONDS que acota ese caso; las escrituras propias
+# siempre tienen un id mayor que cualquier versión que el cliente ya vio.
+
+#  (versión, último cambio) de una sucursal, o global si branch es None
+async def version_actual(session: AsyncSession, branch: Optional[str] = None) -> tuple:
+    stmt = select(StockMovement.id, StockMovement.fecha).order_by(StockMovement.id.desc()).limit(1)
+    if branch is not None:
+        stmt = stmt.where(StockMovement.branch == branch)
+    fila = (await session.execute(stmt)).first()
+    if fila is None:
+        return 0, 0.0
+    return fila.id, fila.fecha.replace(tzinfo=timezone.utc).timestamp()
+
+#  Validadores (ETag fuerte, Last-Modified o None) de una lectura
+async def validadores(session: AsyncSession, branch: Optional[str], variante: str = "") -> tuple:
+    version, modificado = await version_actual(session, branch)
+    ahora = time.time()
+    ventana = int(ahora // ETAG_VALIDITY_SECONDS) if ETAG_VALIDITY_SECONDS > 0 else 0
+    huella = hashlib.blake2s(variante.encode(), digest_size=6).hexdigest()
+    etag = f'"{branch or "*"}-{version}-{ventana}-{huella}"'
+    # Last-Modified tampoco puede ser anterior al inicio de la ventana vigente
+    modificado = max(modificado, ventana * ETAG_VALIDITY_SECONDS)
+    # Last-Modified tiene resolución de segundos: se declara el final del segundo
+    # del último cambio y solo cuando ya pasó, así un cambio posterior siempre
+    # queda en un segundo más nuevo que el If-Modified-Since del cliente
+    segundo = int(modificado) + 1
+    return etag, formatdate(segundo, usegmt=True) if ahora >= segundo else None
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+def _cabeceras(etag: str, ultima_modificacion: Optional[str]) -> dict:
+    cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if ultima_modificacion:
+        cabeceras["Last-Modified"] = ultima_modificacion
+    return cabeceras
+
+#  Devuelve un 304 si el cliente ya tiene esta versión; None si hay que responder completo
+def no_modificado(request: Request, etag: str, ultima_modificacion: Optional[str]) -> Optional[Response]:
+    cabeceras = _cabeceras(etag, ultima_modificacion)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _coincide(if_none_match, etag):
+            return Response(status_code=304, headers=cabeceras)
+        return None
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and ultima_modificacion:
+        try:
+            if parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(ultima_modificacion):
+                return Response(status_code=304, headers=cabeceras)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+#  Agrega los validadores a una respuesta completa
+def con_validadores(response: Response, etag: str, ultima_modificacion: Optional[str]) -> Response:
+    response.headers.update(_cabeceras(etag, ultima_modificacion))
+    return response